@@ -0,0 +1,253 @@
+import argparse
+import contextlib
+import json
+import numpy as np
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+from engine import (POISSON, immigrant_counts, initial_counts, inject_immigrants,
+                    make_initial_population, reproduce_counts, reproduce_generation, simulate, surname_counts)
+from ensemble import load_index
+
+# Timings for the simulation hot paths across population sizes, for both models, saved as JSON so a later
+# run can be compared against a baseline:
+#
+#   python benchmark.py run --output benchmarks/baseline.json
+#   python benchmark.py run --output benchmarks/current.json
+#   python benchmark.py compare benchmarks/baseline.json benchmarks/current.json
+#
+# Each stage is timed `repeats` times on fresh inputs (median and best kept); peak memory comes from one
+# extra run under tracemalloc, kept apart from the timings because tracing slows allocation down.
+
+# The bundled tables next to this file, so the benchmarks run from any working directory
+NATIVE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "surnames_sorted.csv")
+IMMIGRANT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "global_surnames_final.csv")
+IMMIGRATION_RATIOS = {"Indian": 0.4, "Russian": 0.3, "Polish": 0.2, "Arabic": 0.1}
+DEFAULT_SIZES = (10**4, 10**5, 10**6, 10**7)
+
+# Settings of the two models as the scripts run them
+MODELS = {
+    "immigration": {"immigration_fraction": 0.4, "immigration_ratios": IMMIGRATION_RATIOS},
+    "control": {"fertility": POISSON, "mean_children_per_couple": 2.1, "constant_size": True, "even_sexes": True},
+}
+
+def _time(function: Callable, setup: Callable, repeats: int) -> List[float]:
+    times = []
+    for _ in range(repeats):
+        args = setup()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return times
+
+def _peak_memory(function: Callable, setup: Callable) -> int:
+    args = setup()
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def _percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+    return {"p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "max": float(np.max(latencies))}
+
+def _result(name: str, model: str, size: int, times: List[float], peak_bytes: int, people: int, **extra) -> Dict:
+    seconds = float(np.median(times))
+    return {"name": name, "model": model, "size": size,
+            "seconds": seconds, "best_seconds": float(min(times)),
+            "throughput": people / seconds if seconds > 0 else float("inf"),
+            "peak_bytes": peak_bytes, **extra}
+
+# The engine stages one generation goes through, in both representations
+def bench_stages(index, model: str, size: int, repeats: int, seed: int) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    settings = MODELS[model]
+    fertility = {k: settings[k] for k in ("fertility", "mean_children_per_couple") if k in settings}
+    target = {"target_size": size} if settings.get("constant_size") else {}
+    ratios = settings.get("immigration_ratios", {})
+    immigrants = int(size * settings.get("immigration_fraction", 0.0))
+    even = settings.get("even_sexes", False)
+    stages = [
+        ("make_initial_population", size, lambda: make_initial_population(index, size, rng, even), lambda: ()),
+        ("initial_counts", size, lambda: initial_counts(index, size, rng, even), lambda: ()),
+    ]
+    if immigrants:
+        stages += [
+            ("inject_immigrants", immigrants, lambda: inject_immigrants(index, ratios, immigrants, rng), lambda: ()),
+            ("immigrant_counts", immigrants, lambda: immigrant_counts(index, ratios, immigrants, rng), lambda: ()),
+        ]
+    stages += [
+        ("reproduce_generation", size, lambda pop: reproduce_generation(pop, rng, **fertility, **target),
+         lambda: (make_initial_population(index, size, rng, even),)),
+        ("reproduce_counts", size, lambda counts: reproduce_counts(counts, rng, **fertility, **target),
+         lambda: (initial_counts(index, size, rng, even),)),
+        ("surname_counts", size, lambda pop: surname_counts(pop, len(index)),
+         lambda: (make_initial_population(index, size, rng, even),)),
+    ]
+
+    results = []
+    for name, people, function, setup in stages:
+        times = _time(function, setup, repeats)
+        results.append(_result(name, model, size, times, _peak_memory(function, setup), people))
+    results.append(bench_write(index, model, size, repeats, rng))
+    return results
+
+# write_surname_counts for a generation of `size` people, into a scratch directory
+def bench_write(index, model: str, size: int, repeats: int, rng: np.random.Generator) -> Dict:
+    from runner import write_surname_counts
+    with tempfile.TemporaryDirectory() as output_dir:
+        def function(counts):
+            write_surname_counts(counts, 0, index.names, index.nationalities.names, index.origins, output_dir)
+
+        def setup():
+            return (initial_counts(index, size, rng).total(),)
+
+        times = _time(function, setup, repeats)
+        return _result("write_surname_counts", model, size, times, _peak_memory(function, setup), size)
+
+# Whole run_simulation calls (headless, every output in a scratch directory), plus the per-generation latency
+# of the engine loop with the same settings
+def bench_end_to_end(model: str, size: int, generations: int, aggregate: bool, repeats: int, seed: int) -> Dict:
+    with tempfile.TemporaryDirectory() as scratch, open(os.devnull, 'w') as devnull:
+        outputs = {"extinctions_file": os.path.join(scratch, "extinctions.npz"),
+                   "diversity_file": os.path.join(scratch, "diversity.csv"),
+                   "generations_dir": os.path.join(scratch, "generations")}
+        if model == "control":
+            from simulation_no_immigration import run_simulation
+            settings = MODELS[model]
+
+            def run():
+                run_simulation(NATIVE_FILE, generations, size, settings["mean_children_per_couple"], seed=seed,
+                               aggregate=aggregate, plot=None, **outputs)
+        else:
+            from simulation_bubble import run_simulation
+
+            def run():
+                run_simulation(NATIVE_FILE, IMMIGRANT_FILE, generations, size, seed=seed, aggregate=aggregate,
+                               bundle_file=os.path.join(scratch, "run_bundle.json"), **outputs, **MODELS[model])
+
+        with contextlib.redirect_stdout(devnull):
+            times = _time(run, lambda: (), repeats)
+            peak = _peak_memory(run, lambda: ())
+
+    index = load_index(NATIVE_FILE, IMMIGRANT_FILE if model == "immigration" else None)
+    rng = np.random.default_rng(seed)
+    latencies, people = [], 0
+    start = time.perf_counter()
+    for generation in simulate(index, rng, generations, size, aggregate=aggregate, **MODELS[model]):
+        now = time.perf_counter()
+        latencies.append(now - start)
+        people += len(generation.population)
+        start = now
+    return _result("run_simulation_aggregate" if aggregate else "run_simulation", model, size, times, peak, people,
+                   generations=generations, generation_latency=_percentiles(latencies))
+
+def run_benchmarks(sizes: Sequence[int] = DEFAULT_SIZES,
+                   models: Sequence[str] = tuple(MODELS),
+                   generations: int = 10,
+                   repeats: int = 5,
+                   seed: int = 0,
+                   end_to_end: bool = True) -> Dict:
+    results = []
+    for model in models:
+        index = load_index(NATIVE_FILE, IMMIGRANT_FILE if model == "immigration" else None)
+        for size in sizes:
+            print(f"{model} model, {size} people")
+            results += bench_stages(index, model, size, repeats, seed)
+            if end_to_end:
+                for aggregate in (False, True):
+                    results.append(bench_end_to_end(model, size, generations, aggregate, min(repeats, 3), seed))
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "repeats": repeats,
+            "generations": generations,
+        },
+        "results": results,
+    }
+
+def save_results(results: Dict, filename: str):
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+def load_results(filename: str) -> Dict:
+    with open(filename, encoding='utf-8') as f:
+        return json.load(f)
+
+# Benchmarks present in both files, flagged when their best time grew by more than `threshold` (0.1 = 10%
+# slower) and by at least min_delta seconds, so timer noise on sub-millisecond stages is not reported
+def compare(baseline: Dict, current: Dict, threshold: float = 0.1, min_delta: float = 0.001) -> List[Dict]:
+    def key(result):
+        return result["name"], result["model"], result["size"]
+
+    previous = {key(r): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        old, new = before["best_seconds"], result["best_seconds"]
+        ratio = new / old if old > 0 else float("inf")
+        rows.append({"name": result["name"], "model": result["model"], "size": result["size"],
+                     "baseline_seconds": old, "seconds": new, "ratio": ratio,
+                     "memory_ratio": result["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else None,
+                     "slower": ratio > 1 + threshold and new - old >= min_delta})
+    return rows
+
+def print_comparison(rows: List[Dict]):
+    print(f"{'benchmark':<28}{'model':<13}{'size':>10}{'baseline':>12}{'current':>12}{'ratio':>8}{'memory':>8}")
+    for row in rows:
+        flag = "  SLOWER" if row["slower"] else ""
+        memory = f"{row['memory_ratio']:>8.2f}" if row["memory_ratio"] is not None else f"{'-':>8}"
+        print(f"{row['name']:<28}{row['model']:<13}{row['size']:>10}{row['baseline_seconds']:>12.4f}"
+              f"{row['seconds']:>12.4f}{row['ratio']:>8.2f}{memory}{flag}")
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the surname simulation hot paths")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks and save the results as JSON")
+    run.add_argument("--output", default="benchmarks/results.json")
+    run.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    run.add_argument("--models", nargs="+", choices=list(MODELS), default=list(MODELS))
+    run.add_argument("--generations", type=int, default=10)
+    run.add_argument("--repeats", type=int, default=5)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--stages-only", action="store_true", help="skip the end-to-end runs")
+
+    comparison = commands.add_parser("compare", help="flag slowdowns against a saved baseline")
+    comparison.add_argument("baseline")
+    comparison.add_argument("current")
+    comparison.add_argument("--threshold", type=float, default=0.1)
+    comparison.add_argument("--min-delta", type=float, default=0.001, help="ignore changes smaller than this (s)")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        results = run_benchmarks(args.sizes, args.models, args.generations, args.repeats, args.seed,
+                                 end_to_end=not args.stages_only)
+        save_results(results, args.output)
+        print(f"Results written to {args.output}")
+        return 0
+
+    rows = compare(load_results(args.baseline), load_results(args.current), args.threshold, args.min_delta)
+    print_comparison(rows)
+    slower = sum(row["slower"] for row in rows)
+    if slower:
+        print(f"{slower} benchmarks more than {args.threshold:.0%} slower than the baseline")
+    return 1 if slower else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
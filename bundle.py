@@ -0,0 +1,111 @@
+import json
+import numpy as np
+import os
+from typing import Dict, List, Optional
+from layout import TAU, BubbleLayout
+from run_store import open_run
+
+# A whole run for the D3 viewer in one file, fetched once: a manifest (generation count, nationalities and
+# their colours), the surname dictionary once, then per generation only the surnames whose count or place
+# changed, with a count of 0 marking an extinction. Positions come from layout.py and are sent as a place:
+# ring * ANGLE_STEPS + angle in 1/ANGLE_STEPS turns, with each frame's ring distances. The layout rescales and
+# refills its rings every generation, so x and y change for nearly every bubble, but a surname's ring and
+# angle mostly stay put. Each frame's ids are in ascending order and stored as the gaps between them. The
+# viewer applies the frames in order to the one generation it keeps, instead of fetching a CSV per frame.
+
+# Angle resolution: at most half a step off, under a pixel for rings up to about 320 pixels out
+ANGLE_STEPS = 1024
+
+# The viewer's fixed colours; other nationalities take the remaining d3.schemeCategory10 colours in turn
+NATIONALITY_COLOURS = {
+    "English": "#1f77b4",
+    "Indian": "#ff7f0e",
+    "Polish": "#2ca02c",
+    "Russian": "#d62728",
+    "Arabic": "#9467bd",
+}
+SPARE_COLOURS = ["#8c564b", "#e377c2", "#bcbd22", "#17becf"]
+UNKNOWN_COLOUR = "#7f7f7f"
+
+def nationality_colours(nationality_names: List[str]) -> Dict[str, str]:
+    spare = iter(SPARE_COLOURS)
+    return {name: NATIONALITY_COLOURS.get(name) or next(spare, UNKNOWN_COLOUR) for name in nationality_names}
+
+class BundleWriter:
+    def __init__(self,
+                 filename: str,
+                 surname_names: List[str],
+                 nationality_names: List[str],
+                 surname_origins: np.ndarray):
+        self.filename = filename
+        self.surname_names = surname_names
+        self.nationality_names = nationality_names
+        self.surname_origins = np.asarray(surname_origins)
+        self.layout = BubbleLayout(len(surname_names))
+        # What the viewer holds after the frames written so far
+        self.counts = np.zeros(len(surname_names), dtype=np.int64)
+        self.places = np.full(len(surname_names), -1, dtype=np.int64)
+        self.frames = []
+
+    def write_generation(self, counts: np.ndarray):
+        placed = self.layout.place(counts)
+        places = np.full(len(self.places), -1, dtype=np.int64)
+        angles = np.rint(placed.angle / TAU * ANGLE_STEPS).astype(np.int64) % ANGLE_STEPS
+        places[placed.ids] = placed.ring * ANGLE_STEPS + angles
+        changed = np.flatnonzero((counts != self.counts) | (places != self.places))
+        self.frames.append({
+            "ids": changed,
+            "counts": counts[changed].tolist(),
+            "places": places[changed].tolist(),
+            "rings": np.round(placed.rings, 1).tolist(),
+        })
+        self.counts[changed] = counts[changed]
+        self.places = places
+
+    def close(self):
+        # Only surnames that ever appear go in the dictionary; frames refer to them by position in it
+        used = np.unique(np.concatenate([f["ids"] for f in self.frames] or [[]])).astype(np.int64)
+        position = np.full(len(self.surname_names), -1, dtype=np.int64)
+        position[used] = np.arange(len(used))
+        for frame in self.frames:
+            frame["ids"] = np.diff(position[frame["ids"]], prepend=0).tolist()
+
+        bundle = {
+            "manifest": {
+                "generations": len(self.frames),
+                "nationalities": self.nationality_names,
+                "angle_steps": ANGLE_STEPS,
+                # The legend shows the nationalities that appear in the run
+                "colours": nationality_colours([self.nationality_names[n]
+                                                for n in np.unique(self.surname_origins[used])]),
+            },
+            "surnames": [self.surname_names[i] for i in used],
+            "nationalities": self.surname_origins[used].tolist(),
+            "frames": self.frames,
+        }
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        tmp = self.filename + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(bundle, f, separators=(',', ':'))
+        os.replace(tmp, self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Bundle a run file, or a directory of per-generation CSVs (all of it, or the first `generations`)
+def bundle_run(filename: str = "surname-visualisations/generations",
+               output_file: str = "surname-visualisations/run_bundle.json",
+               generations: Optional[int] = None):
+    run = open_run(filename)
+    if generations is not None and len(run) < generations:
+        raise ValueError(f"{filename} holds {len(run)} generations, not the {generations} the run produced")
+    with BundleWriter(output_file, run.surname_names, run.nationality_names, run.surname_origins) as writer:
+        for gen in range(len(run) if generations is None else generations):
+            writer.write_generation(run.counts_vector(gen))
+
+if __name__ == "__main__":
+    import sys
+    bundle_run(*sys.argv[1:3])
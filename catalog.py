@@ -0,0 +1,220 @@
+import numpy as np
+import os
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Tuple
+from run_store import open_run
+
+# Stored runs ingested once into one SQLite file, so runs can be compared without re-reading their CSVs:
+#
+#   catalog = RunCatalog("runs/catalog.sqlite")
+#   catalog.ingest("surname_snapshots", name="control")
+#   catalog.ingest("surname-visualisations/generations", name="immigration")
+#   catalog.trajectory("control", "Smith"), catalog.survivors("immigration", 20)
+#   catalog.nationality_shares("immigration")
+#
+# A source is anything run_store.open_run reads (a .run or .arrow run file, or a directory of generation CSVs).
+# Counts are keyed by (run, generation, surname) with a second index by (run, surname, generation) for
+# trajectories. Per-generation totals by nationality are aggregated in SQL at ingest and kept in the file, and
+# query results are memoised per catalog, so repeated notebook queries do not touch the counts again.
+# Ingesting a source that has not changed since (by size and modification time) is a no-op.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    source TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    generations INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nationalities (
+    run_id INTEGER NOT NULL,
+    nationality_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (run_id, nationality_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS surnames (
+    run_id INTEGER NOT NULL,
+    surname_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    nationality_id INTEGER NOT NULL,
+    PRIMARY KEY (run_id, surname_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS surnames_by_name ON surnames (run_id, name);
+CREATE TABLE IF NOT EXISTS counts (
+    run_id INTEGER NOT NULL,
+    generation INTEGER NOT NULL,
+    surname_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, generation, surname_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS counts_by_surname ON counts (run_id, surname_id, generation);
+CREATE TABLE IF NOT EXISTS nationality_totals (
+    run_id INTEGER NOT NULL,
+    generation INTEGER NOT NULL,
+    nationality_id INTEGER NOT NULL,
+    people INTEGER NOT NULL,
+    surnames INTEGER NOT NULL,
+    PRIMARY KEY (run_id, generation, nationality_id)
+) WITHOUT ROWID;
+"""
+
+TABLES = ["nationality_totals", "counts", "surnames", "nationalities", "runs"]
+
+# Size and modification time of a run file, of every column of a .run directory, or of every generation CSV
+# in a directory of them
+def source_fingerprint(source: str) -> str:
+    if os.path.isdir(source):
+        columns = os.path.exists(os.path.join(source, "manifest.json"))
+        paths = sorted(os.path.join(source, name) for name in os.listdir(source)
+                       if columns or (name.startswith("generation_") and name.endswith(".csv")))
+    else:
+        paths = [source]
+    return ";".join(f"{os.path.basename(p)}:{os.stat(p).st_size}:{os.stat(p).st_mtime_ns}" for p in paths)
+
+class RunCatalog:
+    def __init__(self, filename: str = "runs/catalog.sqlite"):
+        if filename != ":memory:":
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        self._db = sqlite3.connect(filename)
+        self._db.executescript(SCHEMA)
+        self._cache: Dict[Tuple, object] = {}
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run_id(self, run: str) -> int:
+        row = self._db.execute("SELECT run_id FROM runs WHERE name = ?", (run,)).fetchone()
+        if row is None:
+            raise KeyError(f"No run named {run!r} in the catalog")
+        return row[0]
+
+    def _delete(self, run_id: int):
+        for table in TABLES:
+            self._db.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+
+    # Load a run under `name` (the source path by default), replacing an older ingest of it; returns the name
+    def ingest(self, source: str, name: Optional[str] = None) -> str:
+        name = name or source
+        fingerprint = source_fingerprint(source)
+        row = self._db.execute("SELECT run_id, source, fingerprint FROM runs WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[1:] == (source, fingerprint):
+            return name
+
+        run = open_run(source)
+        with self._db:
+            if row is not None:
+                self._delete(row[0])
+            run_id = self._db.execute("INSERT INTO runs (name, source, fingerprint, generations) VALUES (?, ?, ?, ?)",
+                                      (name, source, fingerprint, len(run))).lastrowid
+            self._db.executemany("INSERT INTO nationalities VALUES (?, ?, ?)",
+                                 ((run_id, i, n) for i, n in enumerate(run.nationality_names)))
+            self._db.executemany("INSERT INTO surnames VALUES (?, ?, ?, ?)",
+                                 zip([run_id] * len(run.surname_names), range(len(run.surname_names)),
+                                     run.surname_names, run.surname_origins.tolist()))
+            for gen in range(len(run)):
+                ids, counts = run.generation(gen)
+                present = counts > 0
+                self._db.executemany("INSERT INTO counts VALUES (?, ?, ?, ?)",
+                                     ((run_id, gen, i, c) for i, c in zip(ids[present].tolist(),
+                                                                          counts[present].tolist())))
+            self._db.execute("""
+                INSERT INTO nationality_totals
+                SELECT c.run_id, c.generation, s.nationality_id, SUM(c.count), COUNT(*)
+                FROM counts c JOIN surnames s ON s.run_id = c.run_id AND s.surname_id = c.surname_id
+                WHERE c.run_id = ?
+                GROUP BY c.generation, s.nationality_id""", (run_id,))
+        # Without statistics SQLite reads trajectories through the primary key, scanning the whole run
+        self._db.execute("ANALYZE")
+        self._cache = {key: value for key, value in self._cache.items() if key[1] != name}
+        return name
+
+    def remove(self, run: str):
+        with self._db:
+            self._delete(self._run_id(run))
+        self._cache = {key: value for key, value in self._cache.items() if key[1] != run}
+
+    def runs(self) -> List[str]:
+        return [name for name, in self._db.execute("SELECT name FROM runs ORDER BY run_id")]
+
+    def generations(self, run: str) -> int:
+        return self._db.execute("SELECT generations FROM runs WHERE run_id = ?", (self._run_id(run),)).fetchone()[0]
+
+    def _cached(self, key: Tuple, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    # Count of one surname in every generation of a run, zero where absent. A surname that arrived with several
+    # nationalities is summed over them unless nationality picks one.
+    def trajectory(self, run: str, surname: str, nationality: Optional[str] = None) -> np.ndarray:
+        def compute():
+            run_id = self._run_id(run)
+            trajectory = np.zeros(self.generations(run), dtype=np.int64)
+            lineages = self._db.execute("""
+                SELECT s.surname_id FROM surnames s
+                JOIN nationalities n ON n.run_id = s.run_id AND n.nationality_id = s.nationality_id
+                WHERE s.run_id = ? AND s.name = ? AND (? IS NULL OR n.name = ?)""",
+                                        (run_id, surname, nationality, nationality)).fetchall()
+            for surname_id, in lineages:
+                rows = self._db.execute("SELECT generation, count FROM counts WHERE run_id = ? AND surname_id = ?",
+                                        (run_id, surname_id)).fetchall()
+                if rows:
+                    generations, counts = zip(*rows)
+                    trajectory[list(generations)] += counts
+            trajectory.flags.writeable = False
+            return trajectory
+        return self._cached(("trajectory", run, surname, nationality), compute)
+
+    # (surname, nationality, count) of every surname present in generation G, largest first
+    def survivors(self, run: str, generation: int) -> List[Tuple[str, str, int]]:
+        def compute():
+            return self._db.execute("""
+                SELECT s.name, n.name, c.count FROM counts c
+                JOIN surnames s ON s.run_id = c.run_id AND s.surname_id = c.surname_id
+                JOIN nationalities n ON n.run_id = s.run_id AND n.nationality_id = s.nationality_id
+                WHERE c.run_id = ? AND c.generation = ?
+                ORDER BY c.count DESC, s.name""", (self._run_id(run), generation)).fetchall()
+        return self._cached(("survivors", run, generation), compute)
+
+    # People and surnames present per (generation, nationality), from the aggregates stored at ingest
+    def nationality_totals(self, run: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        def compute():
+            run_id = self._run_id(run)
+            names = [name for name, in self._db.execute(
+                "SELECT name FROM nationalities WHERE run_id = ? ORDER BY nationality_id", (run_id,))]
+            people = np.zeros((self.generations(run), len(names)), dtype=np.int64)
+            surnames = np.zeros_like(people)
+            for gen, nationality, p, s in self._db.execute(
+                    "SELECT generation, nationality_id, people, surnames FROM nationality_totals WHERE run_id = ?",
+                    (run_id,)):
+                people[gen, nationality], surnames[gen, nationality] = p, s
+            people.flags.writeable = surnames.flags.writeable = False
+            return names, people, surnames
+        return self._cached(("nationality_totals", run), compute)
+
+    # Share of each generation's population per nationality: (nationality names, (generations, nationalities))
+    def nationality_shares(self, run: str) -> Tuple[List[str], np.ndarray]:
+        names, people, _ = self.nationality_totals(run)
+        totals = people.sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return names, np.where(totals > 0, people / totals, 0.0)
+
+    # Surnames present in each generation
+    def surviving_counts(self, run: str) -> np.ndarray:
+        return self.nationality_totals(run)[2].sum(axis=1)
+
+if __name__ == "__main__":
+    sources = sys.argv[1:] or ["surname_snapshots", "surname-visualisations/generations"]
+    with RunCatalog() as catalog:
+        for source in sources:
+            run = catalog.ingest(source)
+            surviving = catalog.surviving_counts(run)
+            print(f"{run}: {len(surviving)} generations, {surviving[0]} surnames at the start, "
+                  f"{surviving[-1]} at the end")
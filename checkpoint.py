@@ -0,0 +1,75 @@
+import json
+import numpy as np
+import os
+from typing import List, NamedTuple, Optional, Tuple
+from engine import Population, SurnameCounts, State
+from extinctions import ExtinctionIndex
+
+# Everything needed to continue a run exactly where it stopped: the population as yielded for
+# `generation` (after immigration, before reproduction), the RNG state at that point, and the
+# surname lifespan index and metric history the scripts keep. Resuming with different parameters
+# forks a what-if branch. source and diversity_source are where the run was writing its generations (run
+# file or CSV directory) and diversity rows, so a fork into other files can copy the shared prefix from them.
+class Checkpoint(NamedTuple):
+    generation: int
+    population: State
+    rng_state: dict
+    extinctions: ExtinctionIndex
+    history: List[Tuple[int, int]]
+    source: Optional[str] = None
+    diversity_source: Optional[str] = None
+
+def save_checkpoint(filename: str, checkpoint: Checkpoint):
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    pop = checkpoint.population
+    if isinstance(pop, SurnameCounts):
+        arrays = {"kind": np.array("counts"), "males": pop.males, "females": pop.females}
+    else:
+        arrays = {"kind": np.array("people"), "surnames": pop.surnames, "sexes": pop.sexes,
+                  "nationalities": pop.nationalities}
+
+    # Written under a temporary name and swapped in, so a crash mid-write keeps the previous checkpoint
+    tmp = filename + ".tmp.npz"
+    np.savez(tmp,
+             generation=np.array(checkpoint.generation),
+             rng_state=np.array(json.dumps(checkpoint.rng_state)),
+             **{f"extinctions_{k}": v for k, v in checkpoint.extinctions.state().items()},
+             history=np.array(checkpoint.history, dtype=np.int64).reshape(-1, 2),
+             source=np.array(checkpoint.source or ""),
+             diversity_source=np.array(checkpoint.diversity_source or ""),
+             **arrays)
+    os.replace(tmp, filename)
+
+def load_checkpoint(filename: str) -> Checkpoint:
+    with np.load(filename) as data:
+        if str(data["kind"]) == "counts":
+            pop = SurnameCounts(data["males"], data["females"])
+        else:
+            pop = Population(data["surnames"], data["sexes"], data["nationalities"])
+        return Checkpoint(int(data["generation"]),
+                          pop,
+                          json.loads(str(data["rng_state"])),
+                          ExtinctionIndex.from_state({k[len("extinctions_"):]: data[k] for k in data.files
+                                                      if k.startswith("extinctions_")}),
+                          [tuple(int(v) for v in row) for row in data["history"]],
+                          *(str(data[k]) or None if k in data.files else None for k in ("source", "diversity_source")))
+
+def capture(generation: int,
+            pop: State,
+            rng: np.random.Generator,
+            extinctions: ExtinctionIndex,
+            history: List[Tuple[int, int]],
+            source: Optional[str] = None,
+            diversity_source: Optional[str] = None) -> Checkpoint:
+    return Checkpoint(generation, pop, rng.bit_generator.state, extinctions, list(history), source,
+                      diversity_source)
+
+# Restore the RNG from a checkpoint file and return what simulate(resume_from=...) and the caller need
+def restore(filename: str, rng: np.random.Generator) -> Checkpoint:
+    checkpoint = load_checkpoint(filename)
+    rng.bit_generator.state = checkpoint.rng_state
+    return checkpoint
+
+# True when generation gen should be checkpointed under the given settings
+def due(gen: int, checkpoint_file: Optional[str], checkpoint_every: int) -> bool:
+    return bool(checkpoint_file) and checkpoint_every > 0 and (gen + 1) % checkpoint_every == 0
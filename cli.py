@@ -0,0 +1,131 @@
+import argparse
+import importlib
+import inspect
+import json
+import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# One entry point for every scenario:
+#
+#   python cli.py scenarios/control.json
+#   python cli.py scenarios/immigration_line_chart.json --set generations=20 seed=1 outputs.plot=null
+#
+# A scenario file (JSON, or TOML on Python 3.11+) names the scenario, the script whose run_simulation does
+# the work, and its settings: input files, immigration ratios, fertility model, generations, population,
+# seed, with the output options under "outputs". A file can list several runs under "runs", each overriding
+# the settings around it; all of them are checked before the first starts and run in this one process.
+# Every scenario script runs its generations through the shared runner.Runner, adding only its own plots
+# and viewer. Only the chosen scenarios' modules are imported, and those leave matplotlib, the live server
+# and the viewer's layout code unimported unless a run asks for them, so headless batch runs start quickly.
+
+SCENARIOS = {
+    "bubble": "simulation_bubble",
+    "line_chart": "simulation_line_chart",
+    "no_immigration": "simulation_no_immigration",
+    "regions": "metapopulation",
+}
+
+# Unlike running a script directly, runs from a scenario file only plot when they ask to
+DEFAULTS = {"plot": None}
+
+def load_config(filename: str) -> Dict[str, Any]:
+    if filename.endswith(".toml"):
+        import tomllib
+        with open(filename, 'rb') as f:
+            return tomllib.load(f)
+    with open(filename, encoding='utf-8') as f:
+        return json.load(f)
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = _merge(merged[key], value)
+        merged[key] = value
+    return merged
+
+# --set values are JSON where they parse as JSON (numbers, null, true, lists, objects) and strings otherwise;
+# dotted keys reach into tables, e.g. outputs.run_file=runs/a.run or immigration_ratios.Polish=0.5
+def parse_overrides(assignments: Sequence[str]) -> Dict[str, Any]:
+    overrides: Dict[str, Any] = {}
+    for assignment in assignments:
+        key, separator, text = assignment.partition("=")
+        if not separator:
+            raise ValueError(f"Expected KEY=VALUE, got {assignment!r}")
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            value = text
+        *tables, name = key.split(".")
+        target = overrides
+        for table in tables:
+            target = target.setdefault(table, {})
+        target[name] = value
+    return overrides
+
+# Every run in a config, each with the settings around it and the overrides applied
+def scenario_runs(config: Dict[str, Any], overrides: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    base = {key: value for key, value in config.items() if key != "runs"}
+    return [_merge(_merge(base, run), overrides or {}) for run in config.get("runs", [{}])]
+
+def _flatten(run: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    settings = dict(run)
+    scenario = settings.pop("scenario", None)
+    settings.pop("name", None)
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Unknown scenario {scenario!r}; expected one of {', '.join(SCENARIOS)}")
+    outputs = settings.pop("outputs", {})
+    return scenario, {**settings, **outputs}
+
+# The run_simulation keyword arguments for one run, checked against the scenario's signature
+def run_arguments(run: Dict[str, Any]) -> Dict[str, Any]:
+    scenario, arguments = _flatten(run)
+    parameters = inspect.signature(importlib.import_module(SCENARIOS[scenario]).run_simulation).parameters
+    unknown = sorted(set(arguments) - set(parameters))
+    if unknown:
+        raise ValueError(f"Scenario {scenario!r} does not take {', '.join(unknown)}; "
+                         f"its settings are {', '.join(parameters)}")
+    for key, value in DEFAULTS.items():
+        if key in parameters:
+            arguments.setdefault(key, value)
+    return arguments
+
+# The settings of a single-run scenario file, for a script's __main__ to call its own run_simulation with
+def scenario_settings(filename: str) -> Dict[str, Any]:
+    runs = scenario_runs(load_config(filename))
+    if len(runs) != 1:
+        raise ValueError(f"{filename} holds {len(runs)} runs, expected one")
+    return _flatten(runs[0])[1]
+
+def run_scenario(run: Dict[str, Any]):
+    module = importlib.import_module(SCENARIOS[run["scenario"]])
+    return module.run_simulation(**run_arguments(run))
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run surname simulation scenarios from config files")
+    parser.add_argument("configs", nargs="+", help="scenario files (.json or .toml)")
+    parser.add_argument("--set", dest="overrides", nargs="+", action="extend", default=[], metavar="KEY=VALUE",
+                        help="override a setting in every run, e.g. generations=20 outputs.plot=null")
+    parser.add_argument("--dry-run", action="store_true", help="check the runs and print their settings")
+    args = parser.parse_args(argv)
+
+    try:
+        overrides = parse_overrides(args.overrides)
+        runs = [run for filename in args.configs for run in scenario_runs(load_config(filename), overrides)]
+        for run in runs:
+            run_arguments(run)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    for number, run in enumerate(runs, 1):
+        label = run.get("name") or run["scenario"]
+        if args.dry_run:
+            print(json.dumps({"run": label, **run_arguments(run)}))
+            continue
+        if len(runs) > 1:
+            print(f"Run {number}/{len(runs)}: {label}")
+        run_scenario(run)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import csv
+import numpy as np
+import os
+import sys
+from typing import Dict, List, NamedTuple, Optional, Sequence
+from extinctions import ExtinctionIndex, NEVER
+
+# Per-generation surname diversity, computed from the count vector simulate yields: one pass over the
+# surnames present gives richness, Shannon entropy (natural log), the Gini-Simpson index (the chance two
+# people drawn at random carry different surnames), the Gini coefficient of the surname sizes, the share of
+# the population in the top_k largest surnames, surnames present per nationality, and the surnames born and
+# gone extinct since the previous generation. The presence mask carried from one generation to the next is
+# all the state kept, so the cost does not grow with the run.
+#
+# Rows go to one CSV per run (logs/diversity.csv by default), one line per generation with a column per
+# nationality, instead of a file per generation.
+
+class Diversity(NamedTuple):
+    generation: int
+    population: int
+    richness: int                   # surnames present
+    cumulative_richness: int        # surnames seen so far in the run
+    births: int                     # present now, absent the generation before
+    extinctions: int                # present the generation before, absent now
+    shannon: float
+    simpson: float
+    gini: float
+    top_share: float
+    by_nationality: np.ndarray      # surnames present per reported nationality
+
+    def row(self) -> List:
+        return ([self.generation, self.population, self.richness, self.cumulative_richness, self.births,
+                 self.extinctions] + [round(v, 6) for v in (self.shannon, self.simpson, self.gini, self.top_share)]
+                + self.by_nationality.tolist())
+
+# reported picks the nationalities that get a column (all of them by default), e.g. an index's reported ones
+class DiversityTracker:
+    def __init__(self,
+                 nationality_names: List[str],
+                 surname_origins: np.ndarray,
+                 top_k: int = 10,
+                 reported: Optional[Sequence[str]] = None):
+        self.nationality_names = list(nationality_names if reported is None else reported)
+        self._reported = np.array([nationality_names.index(name) for name in self.nationality_names], dtype=np.intp)
+        self._all_nationalities = len(nationality_names)
+        self.origins = np.asarray(surname_origins, dtype=np.intp)
+        self.top_k = top_k
+        self.present = np.zeros(len(self.origins), dtype=bool)
+        self.seen = np.zeros(len(self.origins), dtype=bool)
+
+    # Carry on from a checkpoint's lifespan index, whose last counts are the previous generation's
+    @classmethod
+    def from_extinctions(cls, extinctions: ExtinctionIndex, top_k: int = 10,
+                         reported: Optional[Sequence[str]] = None) -> "DiversityTracker":
+        tracker = cls(extinctions.nationality_names, extinctions.origins, top_k, reported)
+        tracker.present = extinctions.last_counts > 0
+        tracker.seen = extinctions.first_seen != NEVER
+        return tracker
+
+    def columns(self) -> List[str]:
+        return (["Generation", "Total Population", "Unique Surnames", "Cumulative Unique Surnames", "Births",
+                 "Extinctions", "Shannon", "Simpson", "Gini", f"Top {self.top_k} Share"]
+                + [f"{name} Surnames" for name in self.nationality_names])
+
+    def update(self, generation: int, counts: np.ndarray) -> Diversity:
+        present = counts > 0
+        sizes = counts[present]
+        total = int(sizes.sum())
+        richness = len(sizes)
+
+        births = int(np.count_nonzero(present & ~self.present))
+        extinctions = int(np.count_nonzero(self.present & ~present))
+        self.seen |= present
+        self.present = present
+
+        if total:
+            p = sizes / total
+            shannon = float(-(p * np.log(p)).sum())
+            simpson = float(1 - (p * p).sum())
+            # Gini = 2 sum(i x_i) / (n sum(x)) - (n + 1) / n over the sizes in ascending order
+            ranked = np.sort(sizes)
+            gini = float(2 * np.dot(np.arange(1, richness + 1), ranked) / (richness * total) - (richness + 1) / richness)
+            top = sizes if richness <= self.top_k else np.partition(sizes, richness - self.top_k)[-self.top_k:]
+            top_share = float(top.sum() / total)
+        else:
+            shannon = simpson = gini = top_share = 0.0
+        by_nationality = np.bincount(self.origins[present], minlength=self._all_nationalities)[self._reported]
+
+        return Diversity(generation, total, richness, int(np.count_nonzero(self.seen)), births, extinctions,
+                         shannon, simpson, gini, top_share, by_nationality)
+
+# Appends a tracker's rows to the run's CSV. A resumed run keeps the rows up to the checkpoint's generation and
+# drops any written after it, so the file ends up as if the run had never stopped. A fork into another file
+# takes those rows from the checkpointed run's file (source) instead.
+class DiversityLog:
+    def __init__(self,
+                 filename: str,
+                 columns: List[str],
+                 resume_generation: Optional[int] = None,
+                 source: Optional[str] = None):
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        source = source or filename
+        kept = []
+        if resume_generation is not None and os.path.exists(source):
+            with open(source, newline='', encoding='utf-8') as f:
+                rows = list(csv.reader(f))
+            # A fork may report other nationalities; the kept rows are matched to the new columns by name
+            kept = [dict(zip(rows[0], row)) for row in rows[1:] if int(row[0]) <= resume_generation]
+            kept = [[row.get(column, "0") for column in columns] for row in kept]
+        self._file = open(filename, mode='w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+        self._writer.writerows(kept)
+
+    def write(self, diversity: Diversity):
+        self._writer.writerow(diversity.row())
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_diversity(filename: str) -> Dict[str, np.ndarray]:
+    with open(filename, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    values = np.array(rows[1:], dtype=float).reshape(-1, len(rows[0]))
+    return {column: values[:, i] for i, column in enumerate(rows[0])}
+
+# The same series for a finished run, from its run file or directory of generation CSVs, with a column for
+# every nationality present in it
+def run_diversity(run_filename: str, filename: str, top_k: int = 10):
+    from run_store import open_run
+    run = open_run(run_filename)
+    present = np.unique(np.concatenate([run.surname_origins[run.generation(gen)[0]] for gen in range(len(run))]
+                                       or [np.empty(0, dtype=np.intp)]))
+    tracker = DiversityTracker(run.nationality_names, run.surname_origins, top_k,
+                               [run.nationality_names[n] for n in present])
+    with DiversityLog(filename, tracker.columns()) as log:
+        for gen in range(len(run)):
+            log.write(tracker.update(gen, run.counts_vector(gen)))
+
+if __name__ == "__main__":
+    run_diversity(sys.argv[1] if len(sys.argv) > 1 else "surname-visualisations/generations",
+                  sys.argv[2] if len(sys.argv) > 2 else "logs/diversity.csv")
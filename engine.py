@@ -0,0 +1,354 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Tuple, Dict, Iterable, Iterator, NamedTuple, Optional, Union
+from genealogy import Genealogy
+from instrument import NULL_TRACER, NullTracer
+from sampler import AliasSampler
+from vocabulary import Vocabulary
+
+FEMALE = 0
+MALE = 1
+
+# Fertility models: one child plus a second with fixed probability, or a Poisson number of children
+ONE_PLUS_BERNOULLI = "one_plus_bernoulli"
+POISSON = "poisson"
+
+# A population stored as parallel arrays, one entry per person: interned surname and nationality ids
+# (uint16 for the bundled tables) and a sex bit, so about 5 bytes per person
+@dataclass(frozen=True)
+class Population:
+    surnames: np.ndarray
+    sexes: np.ndarray
+    nationalities: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.surnames)
+
+def empty_population(surname_dtype=np.uint16) -> Population:
+    return Population(np.empty(0, dtype=surname_dtype),
+                      np.empty(0, dtype=np.uint8),
+                      np.empty(0, dtype=np.uint16))
+
+def concat_populations(*populations: Population) -> Population:
+    return Population(np.concatenate([p.surnames for p in populations]),
+                      np.concatenate([p.sexes for p in populations]),
+                      np.concatenate([p.nationalities for p in populations]))
+
+def take(pop: Population, indices: np.ndarray) -> Population:
+    return Population(pop.surnames[indices], pop.sexes[indices], pop.nationalities[indices])
+
+# Number of people carrying each surname id, for either an individual or an aggregate state
+def surname_counts(pop, num_surnames: int) -> np.ndarray:
+    if isinstance(pop, SurnameCounts):
+        return pop.total()
+    return np.bincount(pop.surnames, minlength=num_surnames)
+
+# Interned ids for the native surnames and every nationality's immigrant pool, built once at load time.
+# An id is a lineage: a surname together with the nationality it came in with, so a name that is in the native
+# table and an immigrant pool (or in two pools) is counted, labelled and inherited separately for each, as
+# people kept the nationality they carried. names holds the surname of every id and origins its nationality.
+# reported lists the nationalities a run can draw from (the native one first), which its outputs list.
+class SurnameIndex(NamedTuple):
+    surnames: Vocabulary
+    nationalities: Vocabulary
+    native_ids: np.ndarray
+    native_weights: np.ndarray
+    pool: Dict[str, Tuple[np.ndarray, np.ndarray]]
+    origins: np.ndarray
+    native_sampler: AliasSampler
+    samplers: Dict[str, AliasSampler]
+    names: List[str]
+    reported: List[str]
+
+    def __len__(self) -> int:
+        return len(self.surnames)
+
+# Every pool is interned, in the pool's own order, whatever the run draws from, so the ids are the same for
+# any run over the same tables and a checkpoint can be resumed with other immigration ratios.
+# immigrant_nationalities (e.g. a run's immigration_ratios) only picks the reported nationalities, so ones that
+# never arrive do not appear in its outputs.
+def index_surnames(native_surnames: List[str],
+                   native_frequencies: List[int],
+                   immigrant_pool: Optional[Dict[str, List[Tuple[str, int]]]] = None,
+                   immigrant_nationalities: Optional[Iterable[str]] = None,
+                   native_nationality: str = "English") -> SurnameIndex:
+    immigrant_pool = immigrant_pool or {}
+    nationalities = Vocabulary([native_nationality, *immigrant_pool])
+    if immigrant_nationalities is not None:
+        immigrant_nationalities = set(immigrant_nationalities)
+    reported = [native_nationality] + [nationality for nationality in immigrant_pool
+                                       if immigrant_nationalities is None or nationality in immigrant_nationalities]
+
+    def lineages(names, nationality):
+        return ((name, nationalities.id(nationality)) for name in names)
+
+    # Interned in full first so every id array below gets the final dtype
+    surnames = Vocabulary(lineages(native_surnames, native_nationality))
+    for nationality, entries in immigrant_pool.items():
+        surnames.intern_all(lineages((name for name, _ in entries), nationality))
+
+    native_ids = surnames.intern_all(lineages(native_surnames, native_nationality))
+    native_weights = np.asarray(native_frequencies, dtype=float)
+    pool = {nationality: (surnames.intern_all(lineages((name for name, _ in entries), nationality)),
+                          np.array([freq for _, freq in entries], dtype=float))
+            for nationality, entries in immigrant_pool.items()}
+
+    names = [name for name, _ in surnames.names]
+    origins = np.array([nationality for _, nationality in surnames.names], dtype=nationalities.dtype)
+
+    # Samplers are built once here and reused for every draw in the run
+    native_sampler = AliasSampler(native_weights)
+    samplers = {nationality: AliasSampler(weights) for nationality, (_, weights) in pool.items()}
+
+    return SurnameIndex(surnames, nationalities, native_ids, native_weights, pool, origins, native_sampler, samplers,
+                        names, reported)
+
+# Draw k people with surnames from one weighted source; sexes are random unless given
+def sample_people(ids: np.ndarray,
+                  sampler: AliasSampler,
+                  k: int,
+                  nationality_id: int,
+                  rng: np.random.Generator,
+                  sexes: Optional[np.ndarray] = None) -> Population:
+    if sexes is None:
+        sexes = rng.integers(0, 2, size=k, dtype=np.uint8)
+    return Population(ids[sampler.sample(k, rng)], sexes, np.full(k, nationality_id, dtype=np.uint16))
+
+# Create initial population with native surnames; even_sexes makes exactly half of them male
+def make_initial_population(index: SurnameIndex,
+                            pop_size: int,
+                            rng: np.random.Generator,
+                            even_sexes: bool = False) -> Population:
+    sexes = None
+    if even_sexes:
+        half = pop_size // 2
+        sexes = np.repeat(np.array([MALE, FEMALE], dtype=np.uint8), [half, pop_size - half])
+    # index_surnames always interns the native nationality first
+    return sample_people(index.native_ids, index.native_sampler, pop_size, 0, rng, sexes)
+
+# Add immigrant people each generation
+def inject_immigrants(index: SurnameIndex,
+                      ratios: Dict[str, float],
+                      total_immigrants: int,
+                      rng: np.random.Generator) -> Population:
+    immigrants = [empty_population(index.surnames.dtype)]
+    for nationality, proportion in ratios.items():
+        if nationality not in index.pool:
+            continue
+        ids, _ = index.pool[nationality]
+        num_people = int(total_immigrants * proportion)
+        immigrants.append(sample_people(ids, index.samplers[nationality], num_people, index.nationalities.id(nationality), rng))
+    return concat_populations(*immigrants)
+
+# Surname ids present, most common first, with their counts
+def surname_table(counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    ids = np.flatnonzero(counts)
+    ids = ids[np.argsort(-counts[ids], kind="stable")]
+    return ids, counts[ids]
+
+# Reproduce next generation (patrilineal surname inheritance)
+def reproduce_generation(pop: Population,
+                         rng: np.random.Generator,
+                         fertility: str = ONE_PLUS_BERNOULLI,
+                         mean_children_per_couple: float = 2.0,
+                         second_child_probability: float = 0.44,
+                         target_size: Optional[int] = None,
+                         genealogy: Optional[Genealogy] = None) -> Population:
+    males = np.flatnonzero(pop.sexes == MALE)
+    num_pairs = min(len(males), len(pop) - len(males))
+
+    # Only fathers pass anything on, so pairing reduces to picking a random subset of the men
+    if num_pairs < len(males):
+        fathers = rng.choice(males, size=num_pairs, replace=False, shuffle=False)
+    else:
+        fathers = males
+
+    if fertility == ONE_PLUS_BERNOULLI:
+        num_children = 1 + (rng.random(num_pairs) < second_child_probability)
+    elif fertility == POISSON:
+        num_children = rng.poisson(mean_children_per_couple, num_pairs)
+    else:
+        raise ValueError(f"Unknown fertility model: {fertility}")
+
+    parents = np.repeat(fathers, num_children)
+    children = Population(pop.surnames[parents],
+                          rng.integers(0, 2, size=len(parents), dtype=np.uint8),
+                          pop.nationalities[parents])
+
+    # Resample with replacement back to the requested size (population correction)
+    if target_size is not None and 0 < len(children) != target_size:
+        resampled = rng.integers(0, len(children), size=target_size)
+        children = take(children, resampled)
+        if genealogy is not None:
+            parents = parents[resampled]
+
+    if genealogy is not None:
+        genealogy.children(parents)
+    return children
+
+# Aggregate state: male and female counts per surname id, without individual people
+@dataclass(frozen=True)
+class SurnameCounts:
+    males: np.ndarray
+    females: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.males.sum() + self.females.sum())
+
+    def total(self) -> np.ndarray:
+        return self.males + self.females
+
+def split_sexes(counts: np.ndarray, rng: np.random.Generator) -> SurnameCounts:
+    males = rng.binomial(counts, 0.5)
+    return SurnameCounts(males, counts - males)
+
+# Count-based equivalent of make_initial_population
+def initial_counts(index: SurnameIndex,
+                   pop_size: int,
+                   rng: np.random.Generator,
+                   even_sexes: bool = False) -> SurnameCounts:
+    weights = index.native_weights / index.native_weights.sum()
+
+    def draw(k):
+        return np.bincount(index.native_ids, weights=rng.multinomial(k, weights), minlength=len(index)).astype(np.int64)
+
+    if even_sexes:
+        half = pop_size // 2
+        return SurnameCounts(draw(half), draw(pop_size - half))
+    return split_sexes(draw(pop_size), rng)
+
+# Count-based equivalent of inject_immigrants
+def immigrant_counts(index: SurnameIndex,
+                     ratios: Dict[str, float],
+                     total_immigrants: int,
+                     rng: np.random.Generator) -> SurnameCounts:
+    counts = np.zeros(len(index), dtype=np.int64)
+    for nationality, proportion in ratios.items():
+        if nationality not in index.pool:
+            continue
+        ids, weights = index.pool[nationality]
+        drawn = rng.multinomial(int(total_immigrants * proportion), weights / weights.sum())
+        counts += np.bincount(ids, weights=drawn, minlength=len(index)).astype(np.int64)
+    return split_sexes(counts, rng)
+
+def add_counts(a: SurnameCounts, b: SurnameCounts) -> SurnameCounts:
+    return SurnameCounts(a.males + b.males, a.females + b.females)
+
+# Count-based equivalent of reproduce_generation: same pairing, fertility and sex model
+def reproduce_counts(counts: SurnameCounts,
+                     rng: np.random.Generator,
+                     fertility: str = ONE_PLUS_BERNOULLI,
+                     mean_children_per_couple: float = 2.0,
+                     second_child_probability: float = 0.44,
+                     target_size: Optional[int] = None) -> SurnameCounts:
+    num_males = int(counts.males.sum())
+    num_pairs = min(num_males, int(counts.females.sum()))
+
+    # Fathers are a uniform random subset of the men, i.e. a multivariate hypergeometric draw
+    if num_pairs < num_males:
+        fathers = rng.multivariate_hypergeometric(counts.males, num_pairs)
+    else:
+        fathers = counts.males
+
+    if fertility == ONE_PLUS_BERNOULLI:
+        children = fathers + rng.binomial(fathers, second_child_probability)
+    elif fertility == POISSON:
+        children = rng.poisson(mean_children_per_couple * fathers)
+    else:
+        raise ValueError(f"Unknown fertility model: {fertility}")
+
+    offspring = split_sexes(children, rng)
+    total = int(children.sum())
+
+    # Resampling people with replacement is a multinomial over the (surname, sex) cells
+    if target_size is not None and 0 < total != target_size:
+        cells = np.concatenate([offspring.males, offspring.females])
+        drawn = rng.multinomial(target_size, cells / total)
+        offspring = SurnameCounts(drawn[:len(children)], drawn[len(children):])
+
+    return offspring
+
+State = Union[Population, SurnameCounts]
+
+# What the simulation loop hands out each generation, after immigration and before reproduction
+class Generation(NamedTuple):
+    number: int
+    population: State
+    immigrants: State
+    counts: np.ndarray
+
+# Run the model one generation at a time without any I/O. constant_size resamples each generation back to
+# the previous size (the control model's population correction); aggregate=True tracks counts, not people.
+# resume_from=(generation, population) continues from a population that generation already yielded.
+# tracer (see instrument.py) times the initial, immigration, counting and reproduction stages.
+# genealogy (see genealogy.py) records every child's father; it needs individual people from generation 0.
+def simulate(index: SurnameIndex,
+             rng: np.random.Generator,
+             generations: int = 50,
+             initial_pop_size: int = 10000,
+             immigration_fraction: float = 0.0,
+             immigration_ratios: Optional[Dict[str, float]] = None,
+             fertility: str = ONE_PLUS_BERNOULLI,
+             mean_children_per_couple: float = 2.0,
+             constant_size: bool = False,
+             even_sexes: bool = False,
+             aggregate: bool = False,
+             resume_from: Optional[Tuple[int, State]] = None,
+             tracer: NullTracer = NULL_TRACER,
+             genealogy: Optional[Genealogy] = None) -> Iterator[Generation]:
+    if immigration_ratios is None:
+        immigration_ratios = {}
+    if resume_from is not None:
+        aggregate = isinstance(resume_from[1], SurnameCounts)
+    if genealogy is not None and (aggregate or resume_from is not None):
+        raise ValueError("A genealogy can only be recorded for a new run of individual people")
+    reproduce = reproduce_counts if aggregate else reproduce_generation
+    lineage = {} if genealogy is None else {"genealogy": genealogy}
+
+    def next_generation(pop):
+        with tracer.stage("reproduction"):
+            return reproduce(pop, rng,
+                             fertility=fertility,
+                             mean_children_per_couple=mean_children_per_couple,
+                             target_size=len(pop) if constant_size else None,
+                             **lineage)
+
+    if resume_from is not None:
+        last_gen, pop = resume_from
+        first_gen = last_gen + 1
+        pop = next_generation(pop)
+    else:
+        with tracer.stage("initial"):
+            if aggregate:
+                first_gen, pop = 0, initial_counts(index, initial_pop_size, rng, even_sexes)
+            else:
+                first_gen, pop = 0, make_initial_population(index, initial_pop_size, rng, even_sexes)
+                if genealogy is not None:
+                    genealogy.founders(len(pop))
+
+    try:
+        for gen in range(first_gen, generations):
+            if len(pop) == 0:
+                return
+            tracer.generation(gen, len(pop))
+
+            immigration_size = int(len(pop) * immigration_fraction)
+            with tracer.stage("immigration"):
+                if aggregate:
+                    immigrants = immigrant_counts(index, immigration_ratios, immigration_size, rng)
+                    pop = add_counts(pop, immigrants)
+                else:
+                    immigrants = inject_immigrants(index, immigration_ratios, immigration_size, rng)
+                    pop = concat_populations(pop, immigrants)
+                    if genealogy is not None:
+                        genealogy.founders(len(immigrants))
+
+            with tracer.stage("counting"):
+                counts = surname_counts(pop, len(index))
+            yield Generation(gen, pop, immigrants, counts)
+
+            # Nothing sees the generation after the last one
+            if gen + 1 < generations:
+                pop = next_generation(pop)
+    finally:
+        tracer.finish()
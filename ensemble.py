@@ -0,0 +1,102 @@
+import csv
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, NamedTuple, Optional, Sequence
+from engine import POISSON, SurnameIndex, index_surnames, simulate
+from loaders import load_immigrant_surnames, load_native_surnames
+
+# Model settings matching the standalone scripts, to pass as **params
+IMMIGRATION_MODEL = {}
+CONTROL_MODEL = {"fertility": POISSON, "constant_size": True, "even_sexes": True}
+
+# Each worker process loads the surname tables once and keeps them here
+_index: Optional[SurnameIndex] = None
+
+# nationalities names the immigrant pools a run draws from, which its outputs report (all of them by default);
+# every pool is loaded either way, so surname ids are the same for every run over the same files
+def load_index(native_file: str,
+               immigrant_file: Optional[str] = None,
+               nationalities: Optional[Sequence[str]] = None) -> SurnameIndex:
+    surnames, frequencies = load_native_surnames(native_file)
+    immigrant_pool = load_immigrant_surnames(immigrant_file) if immigrant_file else None
+    return index_surnames(surnames, frequencies, immigrant_pool, nationalities)
+
+def _init_worker(native_file: str, immigrant_file: Optional[str]):
+    global _index
+    _index = load_index(native_file, immigrant_file)
+
+# One replicate as a (2, generations) array of unique surnames and population; zero after die-out
+def run_replicate(seed: np.random.SeedSequence, generations: int, params: Dict) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    trajectory = np.zeros((2, generations), dtype=np.int64)
+    for gen, pop, _, counts in simulate(_index, rng, generations, **params):
+        trajectory[0, gen] = np.count_nonzero(counts)
+        trajectory[1, gen] = len(pop)
+    return trajectory
+
+class EnsembleSummary(NamedTuple):
+    replicates: int
+    quantiles: np.ndarray
+    unique_mean: np.ndarray
+    unique_quantiles: np.ndarray
+    population_mean: np.ndarray
+    population_quantiles: np.ndarray
+
+# Per-generation mean and quantile bands over a (replicates, 2, generations) stack
+def summarise(trajectories: np.ndarray, quantiles: Sequence[float]) -> EnsembleSummary:
+    quantiles = np.asarray(quantiles, dtype=float)
+    unique, population = trajectories[:, 0], trajectories[:, 1]
+    return EnsembleSummary(len(trajectories), quantiles,
+                           unique.mean(axis=0), np.quantile(unique, quantiles, axis=0),
+                           population.mean(axis=0), np.quantile(population, quantiles, axis=0))
+
+# Run independent replicates across a process pool. Replicate i always gets the i-th stream spawned from
+# seed, so results do not depend on the number of workers. Extra keyword arguments go to engine.simulate.
+def run_ensemble(native_file: str,
+                 immigrant_file: Optional[str] = None,
+                 replicates: int = 100,
+                 generations: int = 50,
+                 seed: Optional[int] = None,
+                 workers: Optional[int] = None,
+                 quantiles: Sequence[float] = (0.05, 0.5, 0.95),
+                 **params) -> EnsembleSummary:
+    params.setdefault("aggregate", True)
+    streams = np.random.SeedSequence(seed).spawn(replicates)
+
+    if workers == 1:
+        _init_worker(native_file, immigrant_file)
+        trajectories = list(map(run_replicate, streams, repeat(generations), repeat(params)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(native_file, immigrant_file)) as pool:
+            chunksize = max(1, replicates // (4 * (workers or os.cpu_count() or 1)))
+            trajectories = list(pool.map(run_replicate, streams, repeat(generations), repeat(params),
+                                         chunksize=chunksize))
+
+    return summarise(np.stack(trajectories), quantiles)
+
+def write_ensemble_summary(summary: EnsembleSummary, filename: str):
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    labels = [f"q{q:g}" for q in summary.quantiles]
+    with open(filename, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Generation", "Unique Surnames Mean"] + [f"Unique Surnames {l}" for l in labels]
+                        + ["Population Mean"] + [f"Population {l}" for l in labels])
+        for gen in range(len(summary.unique_mean)):
+            writer.writerow([gen, summary.unique_mean[gen], *summary.unique_quantiles[:, gen],
+                             summary.population_mean[gen], *summary.population_quantiles[:, gen]])
+
+if __name__ == "__main__":
+    summary = run_ensemble(
+        native_file="surnames_sorted.csv",
+        replicates=200,
+        generations=50,
+        initial_pop_size=10000,
+        mean_children_per_couple=2.1,
+        seed=0,
+        **CONTROL_MODEL
+    )
+    write_ensemble_summary(summary, "ensembles/control.csv")
+    print(f"Generation 49: {summary.unique_mean[-1]:.0f} unique surnames on average over {summary.replicates} runs")
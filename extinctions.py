@@ -0,0 +1,126 @@
+import numpy as np
+import os
+from typing import Dict, List, Optional
+
+NEVER = -1
+
+# Per-surname lifespan record kept up to date while a run progresses: first generation seen, generation of
+# (latest) extinction, peak count and when it was reached, plus the surname's origin nationality. Each update
+# only touches surnames whose count changed since the previous generation.
+class ExtinctionIndex:
+    def __init__(self, surname_names: List[str], nationality_names: List[str], surname_origins: np.ndarray):
+        n = len(surname_names)
+        self.surname_names = surname_names
+        self.nationality_names = nationality_names
+        self.origins = np.asarray(surname_origins, dtype=np.uint16)
+        self.first_seen = np.full(n, NEVER, dtype=np.int32)
+        self.extinct_at = np.full(n, NEVER, dtype=np.int32)
+        self.peak = np.zeros(n, dtype=np.int64)
+        self.peak_generation = np.full(n, NEVER, dtype=np.int32)
+        self.last_counts = np.zeros(n, dtype=np.int64)
+        self.generations = 0
+
+    def update(self, generation: int, counts: np.ndarray):
+        changed = np.flatnonzero(counts != self.last_counts)
+        new, old = counts[changed], self.last_counts[changed]
+
+        born = changed[(old == 0) & (new > 0)]
+        self.first_seen[born[self.first_seen[born] == NEVER]] = generation
+        # An immigrant surname can come back after dying out; it is only extinct while absent
+        self.extinct_at[born] = NEVER
+        self.extinct_at[changed[(old > 0) & (new == 0)]] = generation
+
+        rising = changed[new > self.peak[changed]]
+        self.peak[rising] = counts[rising]
+        self.peak_generation[rising] = generation
+
+        self.last_counts[changed] = new
+        self.generations = generation + 1
+
+    # Number of surnames ever seen (the old cumulative_surnames set)
+    def seen_count(self) -> int:
+        return int(np.count_nonzero(self.first_seen != NEVER))
+
+    def _nationality_id(self, nationality: str) -> int:
+        return self.nationality_names.index(nationality)
+
+    # Surname ids matching all given conditions, e.g. extinct(nationality="Polish", before=20)
+    def select(self,
+               nationality: Optional[str] = None,
+               extinct: Optional[bool] = None,
+               extinct_before: Optional[int] = None,
+               extinct_from: Optional[int] = None,
+               first_seen_from: Optional[int] = None,
+               min_peak: Optional[int] = None) -> np.ndarray:
+        mask = self.first_seen != NEVER
+        if nationality is not None:
+            mask &= self.origins == self._nationality_id(nationality)
+        if extinct is not None:
+            mask &= (self.extinct_at != NEVER) == extinct
+        if extinct_before is not None:
+            mask &= (self.extinct_at != NEVER) & (self.extinct_at < extinct_before)
+        if extinct_from is not None:
+            mask &= self.extinct_at >= extinct_from
+        if first_seen_from is not None:
+            mask &= self.first_seen >= first_seen_from
+        if min_peak is not None:
+            mask &= self.peak >= min_peak
+        return np.flatnonzero(mask)
+
+    def extinct(self, nationality: Optional[str] = None, before: Optional[int] = None) -> List[str]:
+        return self.names(self.select(nationality=nationality, extinct=True, extinct_before=before))
+
+    def survivors(self, nationality: Optional[str] = None) -> List[str]:
+        return self.names(self.select(nationality=nationality, extinct=False))
+
+    def names(self, ids: np.ndarray) -> List[str]:
+        return [self.surname_names[i] for i in ids]
+
+    # Lifespan record of one surname
+    # A surname that arrived with several nationalities has a record for each; nationality picks one
+    def lookup(self, surname: str, nationality: Optional[str] = None) -> Dict:
+        ids = [i for i, name in enumerate(self.surname_names) if name == surname]
+        if nationality is not None:
+            ids = [i for i in ids if self.origins[i] == self._nationality_id(nationality)]
+        if not ids:
+            raise ValueError(f"{surname!r} is not in the index")
+        i = ids[0]
+        return {
+            "surname": surname,
+            "nationality": self.nationality_names[self.origins[i]],
+            "first_seen": int(self.first_seen[i]),
+            "extinct_at": int(self.extinct_at[i]),
+            "peak": int(self.peak[i]),
+            "peak_generation": int(self.peak_generation[i]),
+            "current": int(self.last_counts[i]),
+        }
+
+    # Arrays for saving; the name lists are stored alongside so a saved index can be queried on its own
+    def state(self) -> Dict[str, np.ndarray]:
+        return {
+            "surname_names": np.array(self.surname_names, dtype=str),
+            "nationality_names": np.array(self.nationality_names, dtype=str),
+            "origins": self.origins,
+            "first_seen": self.first_seen,
+            "extinct_at": self.extinct_at,
+            "peak": self.peak,
+            "peak_generation": self.peak_generation,
+            "last_counts": self.last_counts,
+            "generations": np.array(self.generations),
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray]) -> "ExtinctionIndex":
+        index = cls(state["surname_names"].tolist(), state["nationality_names"].tolist(), state["origins"])
+        for field in ("first_seen", "extinct_at", "peak", "peak_generation", "last_counts"):
+            setattr(index, field, np.array(state[field]))
+        index.generations = int(state["generations"])
+        return index
+
+    def save(self, filename: str):
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        np.savez_compressed(filename, **self.state())
+
+def load_extinction_index(filename: str) -> ExtinctionIndex:
+    with np.load(filename) as data:
+        return ExtinctionIndex.from_state(data)
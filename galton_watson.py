@@ -0,0 +1,168 @@
+import csv
+import numpy as np
+import os
+from typing import List, NamedTuple, Optional, Sequence
+from engine import POISSON
+from ensemble import EnsembleSummary, run_ensemble
+from loaders import load_native_surnames
+
+# Analytic fast path for the no-immigration model. Every father has Poisson(mean_children_per_couple)
+# children, each a son with probability 1/2, so each surname's male line is a Galton-Watson branching process
+# with Poisson(m/2) sons. Composing the sons' generating functions gives, for every generation g, the
+# probability that one man's line has nobody left by then; raising that to the number of men a surname starts
+# with (or, for the engine's random initial draw, evaluating the binomial generating function of that number)
+# gives every surname's extinction probability at once, in milliseconds.
+#
+# Two parts of the engine are folded in as per-generation averages: once sexes are random, about
+# sqrt(N / 2 pi) men of a population of N have no partner, and constant_size resampling with replacement
+# gives each child Poisson(N / children) copies instead of exactly one, which holds the population flat and
+# makes every line critical.
+
+class ExtinctionCurves(NamedTuple):
+    surnames: List[str]
+    ultimate: np.ndarray            # per surname: probability its line ever dies out
+    extinct: np.ndarray             # (generations, surnames): probability nobody carries it in generation g
+    surviving_mean: np.ndarray      # per generation: expected number of surnames still present
+    surviving_std: np.ndarray       # per generation: its standard deviation, taking surnames as independent
+    population_mean: np.ndarray     # per generation: expected population
+
+class GenerationRates(NamedTuple):
+    population: np.ndarray          # expected population
+    paired: np.ndarray              # probability a man of that generation has a partner
+    resample: Optional[np.ndarray]  # mean copies of each child after constant_size resampling, or None
+
+# Generation 0 has even sexes, as in the control script; later generations draw each child's sex at random
+def generation_rates(founders: float, generations: int, m: float, constant_size: bool) -> GenerationRates:
+    population = np.empty(generations)
+    paired = np.empty(generations)
+    resample = np.empty(generations) if constant_size else None
+    population[0] = founders
+    for g in range(generations):
+        n = population[g]
+        paired[g] = 1.0 if g == 0 or n <= 0 else max(0.0, 1 - np.sqrt(2 / (np.pi * n)))
+        children = m * paired[g] * n / 2
+        if constant_size:
+            resample[g] = n / children if children > 0 else 0.0
+            children = n
+        if g + 1 < generations:
+            population[g + 1] = children
+    return GenerationRates(population, paired, resample)
+
+# Generating function of the number of children (mean = m) or sons (mean = m / 2) a man of generation g leaves
+def offspring_pgf(s: float, mean: float, rates: GenerationRates, g: int) -> float:
+    copies = s if rates.resample is None else np.exp(rates.resample[g] * (s - 1))
+    return 1 - rates.paired[g] + rates.paired[g] * np.exp(mean * (copies - 1))
+
+# Probability that one man of generation 0 has nobody carrying his surname in generation g: none of his male
+# line in generation g - 1 had a child
+def line_extinction(m: float, rates: GenerationRates) -> np.ndarray:
+    generations = len(rates.paired)
+    extinct = np.zeros(generations)
+    for g in range(1, generations):
+        s = offspring_pgf(0.0, m, rates, g - 1)
+        for j in range(g - 2, -1, -1):
+            s = offspring_pgf(s, m / 2, rates, j)
+        extinct[g] = s
+    return extinct
+
+# Smallest fixed point of the sons' generating function; certain extinction unless it is supercritical
+def ultimate_extinction(mean_sons: float, tol: float = 1e-15, max_iterations: int = 100000) -> float:
+    if mean_sons <= 1:
+        return 1.0
+    q = 0.0
+    for _ in range(max_iterations):
+        previous, q = q, np.exp(mean_sons * (q - 1))
+        if abs(q - previous) < tol:
+            break
+    return float(q)
+
+# frequencies are the starting number of men in each surname's line (with as many women), or with
+# initial_pop_size the weights the engine draws its initial population from. Generation 0 is the initial
+# population, matching the generation numbers simulate yields. Ultimate extinction uses the growing
+# population's limit, where every man has a partner; with constant_size every line dies out eventually.
+def extinction_curves(surnames: Sequence[str],
+                      frequencies: Sequence[float],
+                      generations: int = 50,
+                      mean_children_per_couple: float = 2.1,
+                      initial_pop_size: Optional[int] = None,
+                      constant_size: bool = False) -> ExtinctionCurves:
+    m = mean_children_per_couple
+    frequencies = np.asarray(frequencies, dtype=float)
+    q = 1.0 if constant_size else ultimate_extinction(m / 2)
+
+    if initial_pop_size is None:
+        men = frequencies
+        rates = generation_rates(2 * men.sum(), generations, m, constant_size)
+        per_man = line_extinction(m, rates)[1:]
+        extinct = np.empty((generations, len(men)))
+        extinct[0] = men == 0
+        extinct[1:] = np.power.outer(per_man, men)
+        ultimate = q ** men
+    else:
+        # Men and women are drawn separately, initial_pop_size / 2 of each, so a surname's men are
+        # Binomial(men, p) with generating function (1 - p (1 - s)) ** men
+        p = frequencies / frequencies.sum()
+        men = initial_pop_size // 2
+        rates = generation_rates(initial_pop_size, generations, m, constant_size)
+        per_man = line_extinction(m, rates)[1:]
+        extinct = np.empty((generations, len(p)))
+        extinct[0] = np.exp(initial_pop_size * np.log1p(-p))
+        extinct[1:] = np.exp(men * np.log1p(-np.outer(1 - per_man, p)))
+        ultimate = np.exp(men * np.log1p(-p * (1 - q)))
+
+    present = 1 - extinct
+    return ExtinctionCurves(list(surnames), ultimate, extinct, present.sum(axis=1),
+                            np.sqrt((present * extinct).sum(axis=1)), rates.population)
+
+def load_extinction_curves(native_file: str = "surnames_sorted.csv", **kwargs) -> ExtinctionCurves:
+    surnames, frequencies = load_native_surnames(native_file)
+    return extinction_curves(surnames, frequencies, **kwargs)
+
+class CrossCheck(NamedTuple):
+    curves: ExtinctionCurves
+    ensemble: EnsembleSummary
+    z_scores: np.ndarray            # per generation: ensemble mean minus expected, in standard errors
+
+# Run the stochastic engine's ensemble with the control script's fertility and the same settings, and compare
+# its mean surviving-surname curve with the analytic one
+def cross_check(native_file: str = "surnames_sorted.csv",
+                generations: int = 20,
+                initial_pop_size: int = 10000,
+                mean_children_per_couple: float = 2.1,
+                constant_size: bool = False,
+                replicates: int = 100,
+                seed: Optional[int] = None,
+                workers: Optional[int] = None) -> CrossCheck:
+    curves = load_extinction_curves(native_file, generations=generations,
+                                    mean_children_per_couple=mean_children_per_couple,
+                                    initial_pop_size=initial_pop_size, constant_size=constant_size)
+    ensemble = run_ensemble(native_file, replicates=replicates, generations=generations, seed=seed,
+                            workers=workers, initial_pop_size=initial_pop_size, fertility=POISSON,
+                            mean_children_per_couple=mean_children_per_couple, constant_size=constant_size,
+                            even_sexes=True)
+    error = curves.surviving_std / np.sqrt(replicates)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_scores = np.where(error > 0, (ensemble.unique_mean - curves.surviving_mean) / error, 0.0)
+    return CrossCheck(curves, ensemble, z_scores)
+
+def write_extinction_curves(curves: ExtinctionCurves, filename: str):
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    with open(filename, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Generation", "Surviving Surnames Mean", "Surviving Surnames Std", "Population Mean"])
+        writer.writerows(zip(range(len(curves.surviving_mean)), curves.surviving_mean.tolist(),
+                             curves.surviving_std.tolist(), curves.population_mean.tolist()))
+
+def print_cross_check(check: CrossCheck):
+    print(f"{'generation':>10}{'analytic':>12}{'ensemble':>12}{'z':>8}")
+    for gen, (expected, observed, z) in enumerate(zip(check.curves.surviving_mean, check.ensemble.unique_mean,
+                                                      check.z_scores)):
+        print(f"{gen:>10}{expected:>12.1f}{observed:>12.1f}{z:>8.2f}")
+
+if __name__ == "__main__":
+    # The control script's settings
+    curves = load_extinction_curves("surnames_sorted.csv", generations=50, mean_children_per_couple=2.1,
+                                    initial_pop_size=10000, constant_size=True)
+    write_extinction_curves(curves, "ensembles/galton_watson.csv")
+    print(f"Generation 49: {curves.surviving_mean[-1]:.0f} surnames expected to survive "
+          f"(std {curves.surviving_std[-1]:.0f})")
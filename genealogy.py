@@ -0,0 +1,185 @@
+import json
+import numpy as np
+import os
+from typing import List, Optional, Sequence, Tuple
+
+FOUNDER = -1
+MANIFEST = "genealogy.json"
+
+# Father links of a run of the individual-based engine, for lineage queries afterwards. Pass a Genealogy
+# to simulate (run_simulation(..., genealogy_dir=...) in the scripts): reproduce_generation records every
+# child's father as his row in the previous generation, and the initial population and each generation's
+# immigrants come in as founders. A finished generation is appended to the directory as its own .npy file,
+# read back memory-mapped, so only the generation being built is held in memory.
+#
+# After each generation the lines that died out are pruned: people with no descendants in the newest
+# generation are dropped from the files, walking back until a generation loses nobody. What is kept of each
+# past generation is then exactly the ancestry of the people alive now, so disk use follows the surviving
+# ancestry (which narrows quickly going back) rather than generations x population. Rows of the newest
+# generation are its people in population order; older generations also store each kept row's position in
+# its own generation's population ("index_XX.npy") next to the father's row ("parent_XX.npy").
+#
+# Inheritance is patrilineal, so these are male lines, the same lines surnames follow.
+
+def _dtype(size: int):
+    return np.int32 if size < 2**31 else np.int64
+
+class Genealogy:
+    def __init__(self, directory: str, prune_every: int = 1):
+        self.directory = directory
+        self.prune_every = prune_every
+        self.sizes: List[int] = []          # population of each written generation
+        self.founders_added: List[int] = []  # founders each generation started with or took in
+        self._building: List[np.ndarray] = []
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name == MANIFEST or (name.startswith(("parent_", "index_")) and name.endswith(".npy")):
+                os.remove(os.path.join(directory, name))
+
+    @classmethod
+    def open(cls, directory: str) -> "Genealogy":
+        genealogy = cls.__new__(cls)
+        genealogy.directory = directory
+        genealogy.prune_every = 1
+        genealogy._building = []
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        genealogy.sizes = manifest["sizes"]
+        genealogy.founders_added = manifest["founders"]
+        return genealogy
+
+    # Generations written so far
+    @property
+    def generations(self) -> int:
+        return len(self.sizes)
+
+    def _path(self, generation: int, name: str) -> str:
+        return os.path.join(self.directory, f"{name}_{generation:02d}.npy")
+
+    def _read(self, generation: int, name: str = "parent") -> np.ndarray:
+        return np.load(self._path(generation, name), mmap_mode='r')
+
+    def _write(self, generation: int, name: str, values: np.ndarray):
+        path = self._path(generation, name)
+        tmp = path + ".tmp.npy"
+        np.save(tmp, values)
+        os.replace(tmp, path)
+
+    # Population positions of a generation's kept rows; the newest generation is never pruned
+    def _index(self, generation: int) -> np.ndarray:
+        path = self._path(generation, "index")
+        if os.path.exists(path):
+            return np.load(path, mmap_mode='r')
+        return np.arange(self.sizes[generation])
+
+    def _write_manifest(self):
+        with open(os.path.join(self.directory, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump({"sizes": self.sizes, "founders": self.founders_added[:len(self.sizes)]}, f)
+
+    # Recording, called by the engine
+
+    def founders(self, count: int):
+        if not self._building:
+            self.founders_added.append(0)
+            self._building.append(np.empty(0, dtype=np.int32))
+        self._building.append(np.full(count, FOUNDER, dtype=np.int32))
+        self.founders_added[-1] += count
+
+    # parents[i] is the father's position in the population that just reproduced
+    def children(self, parents: np.ndarray):
+        self._finish_generation()
+        self.founders_added.append(0)
+        self._building = [np.asarray(parents).astype(_dtype(self.sizes[-1]))]
+        if len(self.sizes) % self.prune_every == 0:
+            self._prune(self._building[0])
+
+    def _finish_generation(self):
+        parents = np.concatenate(self._building)
+        generation = len(self.sizes)
+        self._write(generation, "parent", parents)
+        self.sizes.append(len(parents))
+        self._building = []
+        self._write_manifest()
+        return parents
+
+    # Drop every row of the written generations with no descendant among `parents` (the rows' children, in
+    # memory when child is None, otherwise generation `child`'s stored links)
+    def _prune(self, parents: np.ndarray, child: Optional[int] = None):
+        pending = False
+        for generation in range(len(self.sizes) - 1 if child is None else child - 1, -1, -1):
+            stored = self._read(generation)
+            linked = parents != FOUNDER
+            alive = np.zeros(len(stored), dtype=bool)
+            alive[parents[linked]] = True
+            if alive.all():
+                break
+            # Renumber the children's links to the rows that stay
+            parents[linked] = (np.cumsum(alive) - 1)[parents[linked]]
+            if child is not None:
+                self._write(child, "parent", parents)
+            kept = np.flatnonzero(alive)
+            self._write(generation, "index", np.asarray(self._index(generation)[kept], dtype=_dtype(len(stored))))
+            parents = np.array(stored[kept])
+            del stored
+            child, pending = generation, True
+        if pending:
+            self._write(child, "parent", parents)
+
+    def close(self):
+        if self._building:
+            parents = self._finish_generation()
+            self._prune(np.array(parents), len(self.sizes) - 1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Queries, on a finished genealogy
+
+    # Position in `generation`'s population of the male-line ancestor of each given person of the newest
+    # generation (all of them by default); FOUNDER where the line was founded by a later immigrant
+    def ancestors(self, generation: int, people: Optional[Sequence[int]] = None) -> np.ndarray:
+        newest = len(self.sizes) - 1
+        rows = np.arange(self.sizes[newest]) if people is None else np.asarray(people, dtype=np.int64)
+        linked = np.ones(len(rows), dtype=bool)
+        for g in range(newest, generation, -1):
+            parents = np.asarray(self._read(g)[rows], dtype=np.int64)
+            linked &= parents != FOUNDER
+            rows = np.where(linked, parents, 0)
+        result = np.full(len(rows), FOUNDER, dtype=np.int64)
+        result[linked] = self._index(generation)[rows[linked]]
+        return result
+
+    # Distinct ancestors of the newest generation in every generation: how the lines coalesce going back
+    def ancestor_counts(self) -> np.ndarray:
+        return np.array([len(self._read(g)) for g in range(len(self.sizes))])
+
+    # Population positions of the founders who entered in `generation` and still have living descendants
+    def surviving_founders(self, generation: int) -> np.ndarray:
+        founders = np.flatnonzero(np.asarray(self._read(generation)) == FOUNDER)
+        return np.asarray(self._index(generation)[founders])
+
+    # Per generation, the fraction of the founders entering then whose lines survive (nan without founders)
+    def founder_survival(self) -> np.ndarray:
+        survival = np.full(len(self.sizes), np.nan)
+        for g, added in enumerate(self.founders_added[:len(self.sizes)]):
+            if added:
+                survival[g] = len(self.surviving_founders(g)) / added
+        return survival
+
+    # (generation, position) of the most recent common male-line ancestor of the given people of the newest
+    # generation, or None when their lines go back to different founders
+    def common_ancestor(self, people: Sequence[int]) -> Optional[Tuple[int, int]]:
+        rows = np.unique(np.asarray(people, dtype=np.int64))
+        for g in range(len(self.sizes) - 1, -1, -1):
+            if len(rows) == 1:
+                return g, int(self._index(g)[rows[0]])
+            if g == 0:
+                break
+            parents = np.asarray(self._read(g)[rows], dtype=np.int64)
+            if (parents == FOUNDER).any():
+                return None
+            rows = np.unique(parents)
+        return None
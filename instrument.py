@@ -0,0 +1,181 @@
+import contextlib
+import json
+import numpy as np
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+# Opt-in per-stage instrumentation for run_simulation. The engine and scripts wrap their stages
+# (immigration, counting, reproduction, output writes, checkpoints, plotting, ...) in tracer.stage(name);
+# each finished stage becomes one record
+#
+#   {"generation", "stage", "start", "seconds", "allocated_blocks", "population", "thread"}
+#
+# plus allocated_bytes / peak_bytes with memory=True (tracemalloc, which slows allocation noticeably).
+# Records go to every hook (any callable) and, with a filename, to a JSON Lines trace file written on close;
+# summarise_trace() or `python instrument.py trace.jsonl` totals them per stage. A "generation" record
+# covers everything from one generation's start to the next. Without tracing, run_simulation uses
+# NULL_TRACER, whose methods do nothing, so the cost is one no-op call per stage.
+
+Record = Dict[str, Union[int, float, str]]
+
+class NullTracer:
+    _stage = contextlib.nullcontext()
+
+    def stage(self, name: str):
+        return self._stage
+
+    def generation(self, generation: int, population: int):
+        pass
+
+    def finish(self):
+        pass
+
+    def wrap(self, name: str, function: Callable) -> Callable:
+        return function
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+NULL_TRACER = NullTracer()
+
+class Tracer(NullTracer):
+    def __init__(self, filename: Optional[str] = None, hooks: Sequence[Callable[[Record], None]] = (),
+                 memory: bool = False):
+        self.filename = filename
+        self.hooks = list(hooks)
+        self.memory = memory
+        self.records: List[Record] = []
+        self.current_generation = -1
+        self.current_population = 0
+        self._origin = time.perf_counter()
+        self._generation_start = None
+        self._lock = threading.Lock()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _emit(self, record: Record):
+        with self._lock:
+            self.records.append(record)
+        for hook in self.hooks:
+            hook(record)
+
+    @contextlib.contextmanager
+    def stage(self, name: str, generation: Optional[int] = None, population: Optional[int] = None):
+        generation = self.current_generation if generation is None else generation
+        population = self.current_population if population is None else population
+        if self.memory:
+            tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {
+                "generation": generation,
+                "stage": name,
+                "start": start - self._origin,
+                "seconds": time.perf_counter() - start,
+                "allocated_blocks": sys.getallocatedblocks() - blocks,
+                "population": population,
+                "thread": threading.current_thread().name,
+            }
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record["allocated_bytes"] = current - traced
+                record["peak_bytes"] = peak - traced
+            self._emit(record)
+
+    # Called by the engine at the start of every generation; closes the previous generation's record
+    def generation(self, generation: int, population: int):
+        now = time.perf_counter()
+        self.finish(now)
+        self.current_generation = generation
+        self.current_population = population
+        self._generation_start = now
+
+    # Close the open generation record; the engine calls this when its loop ends
+    def finish(self, now: Optional[float] = None):
+        now = time.perf_counter() if now is None else now
+        if self._generation_start is not None:
+            self._emit({
+                "generation": self.current_generation,
+                "stage": "generation",
+                "start": self._generation_start - self._origin,
+                "seconds": now - self._generation_start,
+                "allocated_blocks": 0,
+                "population": self.current_population,
+                "thread": threading.current_thread().name,
+            })
+            self._generation_start = None
+
+    # Time `function` as a stage wherever it ends up running (e.g. on the background writer thread), still
+    # attributed to the generation it was handed over in
+    def wrap(self, name: str, function: Callable) -> Callable:
+        generation, population = self.current_generation, self.current_population
+
+        def traced(*args, **kwargs):
+            with self.stage(name, generation, population):
+                return function(*args, **kwargs)
+        return traced
+
+    def close(self):
+        self.finish()
+        if self.memory:
+            tracemalloc.stop()
+            self.memory = False
+        if self.filename:
+            os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+            with open(self.filename, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(record) + "\n" for record in self.records)
+
+# What run_simulation(trace=...) accepts: None (off), a trace filename, or a Tracer with hooks of its own
+def make_tracer(trace: Union[None, str, NullTracer]) -> NullTracer:
+    if trace is None:
+        return NULL_TRACER
+    if isinstance(trace, str):
+        return Tracer(trace)
+    return trace
+
+def load_trace(filename: str) -> List[Record]:
+    with open(filename, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# Per stage: how often it ran, total / mean / p95 / max seconds and allocated blocks, plus bytes when traced
+def summarise_trace(records: Iterable[Record]) -> Dict[str, Dict[str, float]]:
+    stages: Dict[str, List[Record]] = {}
+    for record in records:
+        stages.setdefault(record["stage"], []).append(record)
+    summary = {}
+    for name, entries in stages.items():
+        seconds = np.array([r["seconds"] for r in entries])
+        summary[name] = {
+            "count": len(entries),
+            "total_seconds": float(seconds.sum()),
+            "mean_seconds": float(seconds.mean()),
+            "p95_seconds": float(np.percentile(seconds, 95)),
+            "max_seconds": float(seconds.max()),
+            "allocated_blocks": int(sum(r["allocated_blocks"] for r in entries)),
+        }
+        if "peak_bytes" in entries[0]:
+            summary[name]["max_peak_bytes"] = int(max(r["peak_bytes"] for r in entries))
+    return summary
+
+def print_summary(summary: Dict[str, Dict[str, float]]):
+    print(f"{'stage':<24}{'count':>7}{'total s':>11}{'mean ms':>10}{'p95 ms':>10}{'max ms':>10}{'blocks':>10}")
+    for name, s in sorted(summary.items(), key=lambda item: -item[1]["total_seconds"]):
+        print(f"{name:<24}{s['count']:>7}{s['total_seconds']:>11.3f}{s['mean_seconds'] * 1e3:>10.2f}"
+              f"{s['p95_seconds'] * 1e3:>10.2f}{s['max_seconds'] * 1e3:>10.2f}{s['allocated_blocks']:>10}")
+
+if __name__ == "__main__":
+    print_summary(summarise_trace(load_trace(sys.argv[1])))
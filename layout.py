@@ -0,0 +1,121 @@
+import csv
+import numpy as np
+import os
+from typing import List, NamedTuple, Optional
+from engine import surname_table
+from run_store import open_run
+
+# Precomputed bubble positions for the D3 viewer, so the browser only interpolates between frames instead of
+# running a force simulation per generation. Bubbles are packed in concentric rings, largest in the centre,
+# each ring filled in size order. A surname keeps its angle from one generation to the next and only its ring
+# changes as it grows or shrinks, so bubbles drift instead of jumping. All of it is vectorised within a ring.
+
+GOLDEN_ANGLE = np.pi * (3 - np.sqrt(5))
+TAU = 2 * np.pi
+
+# Centre-relative positions and radii (pixels) of the surnames alive in one generation, most common first, and
+# the same positions as each bubble's ring (0 is the centre) and angle, with the distance of every ring
+class Layout(NamedTuple):
+    ids: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    r: np.ndarray
+    ring: np.ndarray
+    angle: np.ndarray
+    rings: np.ndarray
+
+# Same mapping as the viewer's d3.scaleSqrt().domain([1, maxCount]).range([min_radius, max_radius])
+def bubble_radii(counts: np.ndarray, min_radius: float = 2.0, max_radius: float = 40.0) -> np.ndarray:
+    top = np.sqrt(counts.max()) if len(counts) else 1.0
+    if top <= 1:
+        return np.full(len(counts), (min_radius + max_radius) / 2)
+    return min_radius + (np.sqrt(counts) - 1) * (max_radius - min_radius) / (top - 1)
+
+# Spread the bubbles of one ring around it in the order of their preferred angles, giving each the arc its
+# width needs and sharing out the spare arc in proportion to how far apart they wanted to be
+def _ring_angles(preferred: np.ndarray, widths: np.ndarray) -> np.ndarray:
+    if len(preferred) == 1:
+        return preferred
+    order = np.argsort(preferred, kind="stable")
+    wanted = np.diff(preferred[order], append=preferred[order[0]] + TAU)
+    w = widths[order]
+    needed = (w + np.roll(w, -1)) / 2
+    slack = max(TAU - needed.sum(), 0.0)
+    excess = np.maximum(wanted - needed, 0)
+    share = excess / excess.sum() if excess.sum() > 0 else np.full(len(w), 1 / len(w))
+    # Overfull rings (rare, from rounding) are squeezed evenly rather than wrapping round
+    gaps = (needed + slack * share) * min(1.0, TAU / needed.sum())
+    placed = np.concatenate(([0.0], np.cumsum(gaps[:-1])))
+    # Rotate the ring so bubbles sit as close to their preferred angles as possible
+    placed += np.angle(np.exp(1j * (preferred[order] - placed)).mean())
+    angles = np.empty(len(preferred))
+    angles[order] = np.mod(placed, TAU)
+    return angles
+
+class BubbleLayout:
+    def __init__(self, num_surnames: int, min_radius: float = 2.0, max_radius: float = 40.0, padding: float = 1.0):
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.padding = padding
+        # Surnames not yet placed start on a golden-angle spiral by id, so first placements are spread out
+        self.angles = np.mod(np.arange(num_surnames) * GOLDEN_ANGLE, TAU)
+
+    def place(self, counts: np.ndarray) -> Layout:
+        ids, values = surname_table(counts)
+        radii = bubble_radii(values, self.min_radius, self.max_radius)
+        distance = np.zeros(len(ids))
+        ring_of = np.zeros(len(ids), dtype=np.int64)
+        rings = [0.0]
+        angles = self.angles[ids].copy()
+
+        start, ring, inner = 1, 0.0, radii[0] if len(ids) else 0.0
+        while start < len(ids):
+            outer = radii[start]
+            ring += inner + outer + self.padding
+            # Angle each remaining bubble would take up on this ring; fill it until the circle is used
+            widths = 2 * np.arcsin(np.minimum((radii[start:] + self.padding / 2) / ring, 1.0))
+            end = start + max(1, int(np.searchsorted(np.cumsum(widths), TAU, side='right')))
+            distance[start:end] = ring
+            ring_of[start:end] = len(rings)
+            rings.append(ring)
+            angles[start:end] = _ring_angles(angles[start:end], widths[:end - start])
+            start, inner = end, outer
+
+        self.angles[ids] = angles
+        return Layout(ids, distance * np.cos(angles), distance * np.sin(angles), radii, ring_of, angles,
+                      np.array(rings))
+
+# One CSV per generation with everything the viewer draws: the generation CSV columns plus X, Y and R
+def write_layout(layout: Layout,
+                 counts: np.ndarray,
+                 generation_number: int,
+                 surname_names: List[str],
+                 nationality_names: List[str],
+                 surname_origins: np.ndarray,
+                 output_dir: str = "surname-visualisations/layouts"):
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, f"layout_{generation_number:02d}.csv")
+    with open(filename, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Surname", "Count", "Nationality", "X", "Y", "R"])
+        for surname_id, x, y, r in zip(layout.ids, layout.x, layout.y, layout.r):
+            writer.writerow([surname_names[surname_id], counts[surname_id],
+                             nationality_names[surname_origins[surname_id]], f"{x:.1f}", f"{y:.1f}", f"{r:.1f}"])
+
+# Lay out a run file, or a directory of per-generation CSVs, in generation order (all of it, or the first
+# `generations`)
+def layout_run(filename: str = "surname-visualisations/generations",
+               output_dir: str = "surname-visualisations/layouts",
+               generations: Optional[int] = None):
+    run = open_run(filename)
+    if generations is not None and len(run) < generations:
+        raise ValueError(f"{filename} holds {len(run)} generations, not the {generations} the run produced")
+    layout = BubbleLayout(len(run.surname_names))
+    for gen in range(len(run) if generations is None else generations):
+        counts = run.counts_vector(gen)
+        write_layout(layout.place(counts), counts, gen, run.surname_names, run.nationality_names,
+                     run.surname_origins, output_dir)
+
+if __name__ == "__main__":
+    import sys
+    layout_run(*sys.argv[1:3])
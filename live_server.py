@@ -0,0 +1,167 @@
+import asyncio
+import json
+import mimetypes
+import numpy as np
+import os
+import threading
+from typing import List, Optional
+from bundle import nationality_colours
+from layout import BubbleLayout
+
+# Local server for watching a run as it happens: serves the viewer's static files and pushes each generation
+# to every open page over Server-Sent Events (GET /events). The asyncio loop runs in its own thread; the
+# simulation hands frames over without waiting, and each browser has a small bounded queue that drops its
+# oldest frame when full, so a slow page skips generations instead of holding the run up. Frames are full
+# snapshots rather than deltas, so any frame can be dropped. legend picks the nationalities the page's legend
+# shows (all of them by default).
+
+class LiveServer:
+    def __init__(self,
+                 surname_names: List[str],
+                 nationality_names: List[str],
+                 surname_origins: np.ndarray,
+                 legend: Optional[List[str]] = None,
+                 host: str = "127.0.0.1",
+                 port: int = 8765,
+                 static_dir: str = "surname-visualisations",
+                 queue_size: int = 4):
+        self.host = host
+        self.port = port
+        self.static_dir = os.path.abspath(static_dir)
+        self.queue_size = queue_size
+        self.layout = BubbleLayout(len(surname_names))
+        self.manifest = self._event("manifest", {
+            "surnames": surname_names,
+            "nationalities": nationality_names,
+            "origins": np.asarray(surname_origins).tolist(),
+            "colours": nationality_colours(nationality_names if legend is None else legend),
+            "position_scale": 10,
+        })
+        self.latest = None
+        self.clients: List[asyncio.Queue] = []
+        self.dropped = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._server = None
+        self._writers = set()
+
+    @staticmethod
+    def _event(name: str, payload) -> bytes:
+        return f"event: {name}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n".encode('utf-8')
+
+    def start(self) -> "LiveServer":
+        self._thread.start()
+        self._server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, self.host, self.port), self._loop).result()
+        print(f"Live view at http://{self.host}:{self.port}/?live")
+        return self
+
+    # Called from the simulation thread; lays the generation out here, leaves encoding to the server thread
+    def publish_generation(self, generation: int, counts: np.ndarray, population: int):
+        placed = self.layout.place(counts)
+        frame = (generation, population, placed.ids.copy(), counts[placed.ids],
+                 np.rint(placed.x * 10).astype(np.int64), np.rint(placed.y * 10).astype(np.int64))
+        self._loop.call_soon_threadsafe(self._broadcast, frame)
+
+    def _broadcast(self, frame):
+        # Nothing is encoded while no page is open; the newest frame is kept for pages that join later
+        self.latest = frame
+        if self.clients:
+            message = self._encode(frame)
+            for queue in self.clients:
+                self._offer(queue, message)
+
+    def _encode(self, frame) -> bytes:
+        generation, population, ids, counts, x, y = frame
+        return self._event("generation", {
+            "generation": generation,
+            "population": population,
+            "unique": len(ids),
+            "ids": ids.tolist(),
+            "counts": counts.tolist(),
+            "x": x.tolist(),
+            "y": y.tolist(),
+        })
+
+    def _offer(self, queue: asyncio.Queue, message: Optional[bytes]):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(message)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode('latin-1').split()
+            path = parts[1].split("?")[0] if len(parts) > 1 else "/"
+            if path == "/events":
+                await self._stream(writer)
+            else:
+                await self._send_file(writer, path)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _stream(self, writer: asyncio.StreamWriter):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n\r\n")
+        writer.write(self.manifest)
+        if self.latest:
+            writer.write(self._encode(self.latest))
+        queue = asyncio.Queue(self.queue_size)
+        self.clients.append(queue)
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    writer.write(self._event("done", {}))
+                    await writer.drain()
+                    return
+                writer.write(message)
+                await writer.drain()
+        finally:
+            self.clients.remove(queue)
+
+    async def _send_file(self, writer: asyncio.StreamWriter, path: str):
+        filename = os.path.normpath(os.path.join(self.static_dir, path.lstrip("/") or "index.html"))
+        if os.path.commonpath([filename, self.static_dir]) != self.static_dir or not os.path.isfile(filename):
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+        else:
+            with open(filename, 'rb') as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    # Tell open pages the run is over (they keep the last frame) and shut the server down
+    def close(self):
+        if not self._thread.is_alive():
+            return
+
+        async def shutdown():
+            for queue in self.clients:
+                self._offer(queue, None)
+            await asyncio.sleep(0.1)
+            self._server.close()
+            # Pages that never caught up are cut off
+            for writer in list(self._writers):
+                writer.transport.abort()
+            await asyncio.sleep(0)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        if self.dropped:
+            print(f"Live view dropped {self.dropped} frames for slow pages")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,33 @@
+import csv
+from typing import Dict, List, Tuple
+from prepare_surnames import load_table
+
+# The input tables every scenario reads, shared by the scripts, ensembles, sweeps and the CLI
+
+# Load base surnames (e.g., English)
+def load_native_surnames(file_path: str) -> Tuple[List[str], List[int]]:
+    surnames, frequencies = [], []
+    with open(file_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            surname = row['Name'].strip()
+            freq = int(row['Frequency'])
+            if freq > 0:
+                surnames.append(surname)
+                frequencies.append(freq)
+    return surnames, frequencies
+
+# Load global surnames (immigrant pool)
+def load_immigrant_surnames(file_path: str) -> Dict[str, List[Tuple[str, int]]]:
+    # Prebuilt table from prepare_surnames.prepare()
+    if file_path.endswith(".npz"):
+        return load_table(file_path)
+    immigrants = {}
+    with open(file_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            nationality = row['nationality'].strip()
+            name = row['name'].strip()
+            freq = int(row['ZipfPopularity'])
+            immigrants.setdefault(nationality, []).append((name, freq))
+    return immigrants
@@ -0,0 +1,340 @@
+import contextlib
+import multiprocessing
+import numpy as np
+import os
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from engine import (FEMALE, MALE, ONE_PLUS_BERNOULLI, Population, SurnameCounts, SurnameIndex, add_counts,
+                    concat_populations, immigrant_counts, initial_counts, inject_immigrants,
+                    make_initial_population, reproduce_counts, reproduce_generation, surname_counts, take)
+from ensemble import load_index
+from run_store import RunWriter
+
+# Metapopulation mode: the country as regional shards instead of one well-mixed pool. Every region has its
+# own size and immigration ratios and pairs and reproduces only within itself; each generation a migration
+# matrix moves people between regions. A generation goes
+#
+#   reproduction -> immigration -> emigration | arrivals -> counting -> yield
+#
+# with every shard in its own worker process (or all in this one with processes=False, which gives the same
+# results). Migrants never travel as pickled people: shard i writes how many of each surname and sex leave
+# for every other region into row i of a shared-memory buffer, and once all shards have done so, shard i
+# adds up column i. The per-surname counts each generation yields come back through a second shared buffer;
+# only short commands and a few numbers go through the pipes. Each shard draws from its own stream spawned
+# from seed, so results do not depend on process scheduling.
+
+class Region(NamedTuple):
+    name: str
+    initial_pop_size: int
+    immigration_fraction: float = 0.0
+    immigration_ratios: Dict[str, float] = {}
+
+class RegionGeneration(NamedTuple):
+    number: int
+    populations: np.ndarray         # people per region
+    region_counts: np.ndarray       # (regions, surnames)
+    counts: np.ndarray              # all regions together
+    migrants: np.ndarray            # (regions, regions): people who moved from i to j this generation
+
+# migration[i, j] is the fraction of region i moving to region j each generation; the diagonal is ignored
+def check_migration(migration: np.ndarray, regions: int) -> np.ndarray:
+    migration = np.array(migration, dtype=float)
+    if migration.shape != (regions, regions):
+        raise ValueError(f"Migration matrix must be {regions}x{regions}, got {migration.shape}")
+    np.fill_diagonal(migration, 0.0)
+    if (migration < 0).any() or (migration.sum(axis=1) > 1 + 1e-12).any():
+        raise ValueError("Migration rates must be non-negative and sum to at most 1 per region")
+    return migration
+
+# Every region sends `rate` of its people each generation, spread evenly over the others
+def uniform_migration(regions: int, rate: float) -> np.ndarray:
+    migration = np.full((regions, regions), rate / max(regions - 1, 1))
+    np.fill_diagonal(migration, 0.0)
+    return migration
+
+def _attach(name: str, shape, dtype=np.int64):
+    memory = SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+# One region, in people (aggregate=False) or per-surname counts; outbox is the shared (regions, regions, 2,
+# surnames) migrant buffer and counts the shared (regions, surnames) buffer of what each region yields
+class Shard:
+    def __init__(self,
+                 number: int,
+                 region: Region,
+                 index: SurnameIndex,
+                 migration: np.ndarray,
+                 seed: np.random.SeedSequence,
+                 outbox: np.ndarray,
+                 counts: np.ndarray,
+                 aggregate: bool = True,
+                 fertility: str = ONE_PLUS_BERNOULLI,
+                 mean_children_per_couple: float = 2.0,
+                 constant_size: bool = False,
+                 even_sexes: bool = False):
+        self.number = number
+        self.region = region
+        self.index = index
+        self.outgoing = migration[number]
+        self.rng = np.random.default_rng(seed)
+        self.outbox = outbox
+        self.counts = counts
+        self.aggregate = aggregate
+        self.fertility = fertility
+        self.mean_children_per_couple = mean_children_per_couple
+        self.constant_size = constant_size
+        if aggregate:
+            self.pop = initial_counts(index, region.initial_pop_size, self.rng, even_sexes)
+        else:
+            self.pop = make_initial_population(index, region.initial_pop_size, self.rng, even_sexes)
+        self.started = False
+
+    # Reproduce (from the second generation on), take in immigrants and send emigrants to the outbox
+    def emigrate(self) -> int:
+        reproduce = reproduce_counts if self.aggregate else reproduce_generation
+        if self.started:
+            self.pop = reproduce(self.pop, self.rng,
+                                 fertility=self.fertility,
+                                 mean_children_per_couple=self.mean_children_per_couple,
+                                 target_size=len(self.pop) if self.constant_size else None)
+        self.started = True
+
+        size = int(len(self.pop) * self.region.immigration_fraction)
+        if self.aggregate:
+            immigrants = immigrant_counts(self.index, self.region.immigration_ratios, size, self.rng)
+            self.pop = add_counts(self.pop, immigrants)
+        else:
+            immigrants = inject_immigrants(self.index, self.region.immigration_ratios, size, self.rng)
+            self.pop = concat_populations(self.pop, immigrants)
+
+        if self.aggregate:
+            self._emigrate_counts()
+        else:
+            self._emigrate_people()
+        return len(immigrants)
+
+    # Each surname and sex splits over the destinations as a multinomial, drawn as a chain of binomials
+    def _emigrate_counts(self):
+        outbox = self.outbox[self.number]
+        outbox[:] = 0
+        remaining = {MALE: self.pop.males.copy(), FEMALE: self.pop.females.copy()}
+        left = 1.0
+        for destination in np.flatnonzero(self.outgoing):
+            share = min(self.outgoing[destination] / left, 1.0)
+            for sex, cells in remaining.items():
+                moved = self.rng.binomial(cells, share)
+                outbox[destination, sex] = moved
+                cells -= moved
+            left -= self.outgoing[destination]
+        self.pop = SurnameCounts(remaining[MALE], remaining[FEMALE])
+
+    def _emigrate_people(self):
+        regions, num_surnames = len(self.outgoing), self.outbox.shape[-1]
+        stay = self.outgoing.copy()
+        stay[self.number] = max(0.0, 1 - self.outgoing.sum())
+        destinations = self.rng.choice(regions, size=len(self.pop), p=stay / stay.sum())
+        moving = destinations != self.number
+        cells = (destinations[moving].astype(np.int64) * 2 + self.pop.sexes[moving]) * num_surnames
+        cells += self.pop.surnames[moving]
+        self.outbox[self.number] = np.bincount(cells, minlength=regions * 2 * num_surnames).reshape(
+            regions, 2, num_surnames)
+        self.pop = take(self.pop, np.flatnonzero(~moving))
+
+    # Take in everyone sent here and publish this region's counts
+    def settle(self) -> int:
+        arrivals = self.outbox[:, self.number].sum(axis=0)
+        if self.aggregate:
+            self.pop = add_counts(self.pop, SurnameCounts(arrivals[MALE], arrivals[FEMALE]))
+        else:
+            people = []
+            for sex in (MALE, FEMALE):
+                surnames = np.repeat(np.arange(len(arrivals[sex]), dtype=self.index.surnames.dtype), arrivals[sex])
+                people.append(Population(surnames, np.full(len(surnames), sex, dtype=np.uint8),
+                                         self.index.origins[surnames].astype(np.uint16)))
+            self.pop = concat_populations(self.pop, *people)
+        self.counts[self.number] = surname_counts(self.pop, len(self.index))
+        return len(self.pop)
+
+# Worker process: attaches the shared buffers and runs one shard's commands
+def _run_shard(connection, index: SurnameIndex, number: int, buffers: Dict, shard_args: Dict):
+    memories = []
+    try:
+        outbox_memory, outbox = _attach(buffers["outbox"], buffers["outbox_shape"])
+        counts_memory, counts = _attach(buffers["counts"], buffers["counts_shape"])
+        memories = [outbox_memory, counts_memory]
+        shard = Shard(number, index=index, outbox=outbox, counts=counts, **shard_args)
+        connection.send(("ready", None))
+        while True:
+            command = connection.recv()
+            if command is None:
+                break
+            connection.send(("ok", getattr(shard, command)()))
+    except BaseException:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        shard = outbox = counts = None
+        for memory in memories:
+            memory.close()
+        connection.close()
+
+class _Workers:
+    def __init__(self, connections):
+        self.connections = connections
+
+    # Send a command to every shard at once, then wait for all the replies
+    def broadcast(self, command: str) -> List:
+        for connection in self.connections:
+            connection.send(command)
+        return [self._reply(connection) for connection in self.connections]
+
+    @staticmethod
+    def _reply(connection):
+        status, value = connection.recv()
+        if status == "error":
+            raise RuntimeError(f"Shard failed:\n{value}")
+        return value
+
+class _Serial:
+    def __init__(self, shards: List[Shard]):
+        self.shards = shards
+
+    def broadcast(self, command: str) -> List:
+        return [getattr(shard, command)() for shard in self.shards]
+
+# Run the regions for `generations` generations, yielding each after migration. Extra keyword arguments
+# (fertility, mean_children_per_couple, constant_size, even_sexes) apply to every region's engine.
+def simulate_regions(index: SurnameIndex,
+                     regions: Sequence[Region],
+                     migration: np.ndarray,
+                     generations: int = 50,
+                     seed: Optional[int] = None,
+                     aggregate: bool = True,
+                     processes: bool = True,
+                     **params) -> Iterator[RegionGeneration]:
+    migration = check_migration(migration, len(regions))
+    num_regions, num_surnames = len(regions), len(index)
+    streams = np.random.SeedSequence(seed).spawn(num_regions)
+
+    outbox_shape = (num_regions, num_regions, 2, num_surnames)
+    counts_shape = (num_regions, num_surnames)
+    outbox_memory = SharedMemory(create=True, size=max(1, int(np.prod(outbox_shape)) * 8))
+    counts_memory = SharedMemory(create=True, size=max(1, int(np.prod(counts_shape)) * 8))
+    outbox = np.ndarray(outbox_shape, dtype=np.int64, buffer=outbox_memory.buf)
+    counts = np.ndarray(counts_shape, dtype=np.int64, buffer=counts_memory.buf)
+    outbox[:] = 0
+    buffers = {"outbox": outbox_memory.name, "outbox_shape": outbox_shape,
+               "counts": counts_memory.name, "counts_shape": counts_shape}
+
+    def shard_args(number):
+        return dict(region=regions[number], migration=migration, seed=streams[number], aggregate=aggregate, **params)
+
+    connections, workers, shards = [], [], None
+    try:
+        if processes:
+            for number in range(num_regions):
+                parent, child = multiprocessing.Pipe()
+                worker = multiprocessing.Process(target=_run_shard, daemon=True,
+                                                 args=(child, index, number, buffers, shard_args(number)))
+                worker.start()
+                child.close()
+                connections.append(parent)
+                workers.append(worker)
+            shards = _Workers(connections)
+            for connection in connections:
+                shards._reply(connection)
+        else:
+            shards = _Serial([Shard(number, index=index, outbox=outbox, counts=counts, **shard_args(number))
+                              for number in range(num_regions)])
+
+        for gen in range(generations):
+            shards.broadcast("emigrate")
+            migrants = outbox.sum(axis=(2, 3))
+            populations = np.array(shards.broadcast("settle"))
+            region_counts = counts.copy()
+            yield RegionGeneration(gen, populations, region_counts, region_counts.sum(axis=0), migrants)
+            if populations.sum() == 0:
+                return
+    finally:
+        for connection in connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        for connection in connections:
+            connection.close()
+        # The buffers can only be released once nothing in this process views them
+        shards = outbox = counts = None
+        outbox_memory.close()
+        outbox_memory.unlink()
+        counts_memory.close()
+        counts_memory.unlink()
+
+# Entry point for cli.py ("scenario": "regions"). regions are Regions or dicts of their fields; migration
+# is the full matrix, or migration_rate spreads that fraction of every region evenly over the others.
+# run_file stores the country's combined counts per generation and region_run_dir one run file per region.
+def run_simulation(native_file: str,
+                   regions: Sequence,
+                   immigrant_file: Optional[str] = None,
+                   migration: Optional[Sequence[Sequence[float]]] = None,
+                   migration_rate: float = 0.0,
+                   generations: int = 50,
+                   seed: Optional[int] = None,
+                   aggregate: bool = True,
+                   processes: bool = True,
+                   fertility: str = ONE_PLUS_BERNOULLI,
+                   mean_children_per_couple: float = 2.0,
+                   constant_size: bool = False,
+                   even_sexes: bool = False,
+                   run_file: Optional[str] = None,
+                   region_run_dir: Optional[str] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    regions = [region if isinstance(region, Region) else Region(**region) for region in regions]
+    if migration is None:
+        migration = uniform_migration(len(regions), migration_rate)
+    index = load_index(native_file, immigrant_file,
+                       list(dict.fromkeys(n for region in regions for n in region.immigration_ratios)))
+    names = (index.names, index.nationalities.names, index.origins)
+
+    writers = []
+    if run_file:
+        writers.append((None, RunWriter(run_file, *names)))
+    if region_run_dir:
+        writers += [(number, RunWriter(os.path.join(region_run_dir, f"{region.name}.run"), *names))
+                    for number, region in enumerate(regions)]
+
+    history = []
+    with contextlib.ExitStack() as stack:
+        for _, writer in writers:
+            stack.enter_context(writer)
+        for generation in simulate_regions(index, regions, migration, generations, seed, aggregate, processes,
+                                           fertility=fertility,
+                                           mean_children_per_couple=mean_children_per_couple,
+                                           constant_size=constant_size,
+                                           even_sexes=even_sexes):
+            unique = np.count_nonzero(generation.region_counts, axis=1)
+            for number, writer in writers:
+                writer.write_generation(generation.counts if number is None else generation.region_counts[number])
+            history.append((generation.populations, unique))
+            print(f"Generation {generation.number}: "
+                  + ", ".join(f"{region.name} {people} people/{count} surnames"
+                              for region, people, count in zip(regions, generation.populations, unique)))
+    return history
+
+if __name__ == "__main__":
+    run_simulation(
+        native_file="surnames_sorted.csv",
+        immigrant_file="global_surnames_final.csv",
+        regions=[
+            Region("London", 40000, 0.4, {"Indian": 0.5, "Polish": 0.3, "Arabic": 0.2}),
+            Region("North", 30000, 0.1, {"Polish": 0.6, "Russian": 0.4}),
+            Region("Wales", 10000, 0.02, {"Polish": 1.0}),
+            Region("Scotland", 20000, 0.05, {"Polish": 0.5, "Indian": 0.5}),
+        ],
+        migration_rate=0.05,
+        generations=20,
+        seed=0,
+    )
@@ -0,0 +1,65 @@
+import queue
+import threading
+from typing import Callable
+
+# Runs a simulation's per-generation output writes (CSV files, run-file batches) on a background thread, so
+# the disk I/O for one generation overlaps the simulation of the next. Writes run in submission order.
+# submit() only blocks once max_pending writes are waiting, which bounds how many count arrays are held;
+# arguments must not be modified after they are handed over (simulate yields fresh arrays every generation).
+# An exception in a write is re-raised in the simulation thread at the next submit, flush or close, and
+# the writes queued after it are skipped.
+class BackgroundWriter:
+    def __init__(self, max_pending: int = 8):
+        self._queue = queue.Queue(max_pending)
+        self._failure = None
+        self._failed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                if not self._failed:
+                    function, args, kwargs = task
+                    function(*args, **kwargs)
+            except BaseException as e:
+                self._failure = e
+                self._failed = True
+            finally:
+                self._queue.task_done()
+
+    def _raise_failure(self):
+        if self._failure is not None:
+            failure, self._failure = self._failure, None
+            raise failure
+
+    def submit(self, function: Callable, *args, **kwargs):
+        self._raise_failure()
+        self._queue.put((function, args, kwargs))
+
+    # Wait until everything submitted so far is on disk
+    def flush(self):
+        self._queue.join()
+        self._raise_failure()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_failure()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+            return
+        # Pending writes are still finished when the run fails, but the run's own error takes precedence
+        try:
+            self.close()
+        except Exception:
+            pass
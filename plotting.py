@@ -0,0 +1,110 @@
+import queue
+import threading
+from typing import Iterable, List, Optional, Tuple
+from instrument import NULL_TRACER, NullTracer
+
+# Plot modes for run_simulation: live chart, one chart after the run, or headless (None)
+LIVE = "live"
+AFTER = "after"
+
+# One (unique surnames, total population) pair per generation
+Metrics = Tuple[int, int]
+
+# matplotlib is imported here rather than at module load so headless runs never pay for it
+def _make_chart():
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.set_title("Unique Surnames and Population Over Generations")
+    ax.set_xlabel("Generation")
+    ax.set_ylabel("Count")
+    unique_line, = ax.plot([], [], label="Unique Surnames", color='blue', marker='o')
+    total_line, = ax.plot([], [], label="Total Population", color='red', marker='s')
+    ax.legend()
+    return plt, ax, unique_line, total_line
+
+def _draw(ax, unique_line, total_line, history: List[Metrics]):
+    generations = range(len(history))
+    unique_line.set_data(generations, [m[0] for m in history])
+    total_line.set_data(generations, [m[1] for m in history])
+    ax.relim()
+    ax.autoscale_view()
+
+# Draw the full history once, to a file if given, otherwise on screen
+def render_metrics(history: List[Metrics], filename: Optional[str] = None):
+    plt, ax, unique_line, total_line = _make_chart()
+    _draw(ax, unique_line, total_line, history)
+    if filename:
+        plt.savefig(filename)
+        plt.close()
+    else:
+        plt.show()
+
+# The simulation runs in a worker thread and streams metrics through a queue; the main thread (which the
+# GUI needs) only redraws when new generations have arrived, so the chart never holds the simulation up.
+def _live_plot(metrics: Iterable[Metrics],
+               refresh_interval: float,
+               history: List[Metrics],
+               tracer: NullTracer) -> List[Metrics]:
+    stream = queue.Queue()
+    done = object()
+    failure = []
+
+    def produce():
+        try:
+            for item in metrics:
+                stream.put(item)
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            stream.put(done)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+
+    plt, ax, unique_line, total_line = _make_chart()
+    plt.ion()
+    if history:
+        _draw(ax, unique_line, total_line, history)
+    finished = False
+    while not finished:
+        received = False
+        try:
+            while True:
+                item = stream.get_nowait()
+                if item is done:
+                    finished = True
+                    break
+                history.append(item)
+                received = True
+        except queue.Empty:
+            pass
+        with tracer.stage("plot"):
+            if received:
+                _draw(ax, unique_line, total_line, history)
+            plt.pause(refresh_interval)
+
+    worker.join()
+    if failure:
+        raise failure[0]
+    plt.ioff()
+    plt.show()
+    return history
+
+# Consume a run's metrics stream according to the plot mode and return the collected history;
+# history holds generations from before a resumed run so the chart shows the whole run
+def consume_metrics(metrics: Iterable[Metrics],
+                    plot: Optional[str] = LIVE,
+                    refresh_interval: float = 0.1,
+                    filename: Optional[str] = None,
+                    history: Optional[List[Metrics]] = None,
+                    tracer: NullTracer = NULL_TRACER) -> List[Metrics]:
+    history = list(history or [])
+    if plot == LIVE:
+        return _live_plot(metrics, refresh_interval, history, tracer)
+    history.extend(metrics)
+    if plot == AFTER:
+        with tracer.stage("plot"):
+            render_metrics(history, filename)
+    elif plot is not None:
+        raise ValueError(f"Unknown plot mode: {plot}")
+    return history
@@ -0,0 +1,164 @@
+import csv
+import hashlib
+import itertools
+import json
+import numpy as np
+import os
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Builds the immigrant surname pool in one pass: read the raw global and extra surname lists once, stream
+# the rows through the stages below, and write a single binary table. Tables are cached under a hash of the
+# input-file contents and every stage parameter, so rerunning with unchanged inputs costs one file load.
+#
+#   clean -> enrich -> zipf_weight -> sort_by_weight -> drop_nationalities -> rescale
+#
+# This replaces the old chain of global_surname_cleaner.py, enrich_global_surnames.py, frequencies.py,
+# sorting_script.py and remove_surnames.py, each of which re-read and re-wrote a full CSV.
+
+# (nationality, name, weight) as it moves through the stages; weight is 0 until zipf_weight runs
+Row = Tuple[str, str, int]
+
+# SHA-256 of a file's contents, memoised on its size and modification time so an edited file is hashed again
+def file_digest(file_path: str) -> str:
+    stat = os.stat(file_path)
+    return _digest(os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+@lru_cache(maxsize=None)
+def _digest(file_path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_surnames(file_path: str, nationality: Optional[str] = None, name_column: str = "name") -> Iterator[Row]:
+    with open(file_path, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            yield (nationality or row['nationality'], row[name_column], 0)
+
+# Strip whitespace, normalise capitalisation ("Ou-Yang" -> "Ou-yang") and skip blank names
+def clean(rows: Iterable[Row]) -> Iterator[Row]:
+    for nationality, name, weight in rows:
+        name = name.strip().capitalize()
+        if name:
+            yield (nationality.strip(), name, weight)
+
+# Append another surname list (e.g. the Indian names) after the global one
+def enrich(rows: Iterable[Row], extra: Iterable[Row]) -> Iterator[Row]:
+    return itertools.chain(rows, clean(extra))
+
+# Give every row a Zipf-distributed popularity, drawn in blocks so the stream never has to be materialised
+def zipf_weight(rows: Iterable[Row], rng: np.random.Generator, a: float = 1.5, block: int = 4096) -> Iterator[Row]:
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, block))
+        if not chunk:
+            return
+        for (nationality, name, _), weight in zip(chunk, rng.zipf(a, size=len(chunk))):
+            yield (nationality, name, int(weight))
+
+# Most popular first; ties keep their input order
+def sort_by_weight(rows: Iterable[Row]) -> List[Row]:
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+# Drop nationalities already covered by the native table (case-insensitive)
+def drop_nationalities(rows: Iterable[Row], excluded: Sequence[str]) -> Iterator[Row]:
+    excluded = {n.lower() for n in excluded}
+    return (row for row in rows if row[0].lower() not in excluded)
+
+# Min-max rescale each nationality's weights onto 1..target_ratio; groups come out in order of first
+# appearance, each keeping its internal order
+def rescale(rows: Iterable[Row], target_ratio: int = 775) -> Iterator[Row]:
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row[0]].append(row)
+    for nationality, group in groups.items():
+        weights = np.array([w for _, _, w in group], dtype=float)
+        low, high = weights.min(), weights.max()
+        if low == high:
+            scaled = np.ones(len(group), dtype=np.int64)
+        else:
+            # np.rint rounds half to even, like the old script's round()
+            scaled = np.rint(1 + (weights - low) * (target_ratio - 1) / (high - low)).astype(np.int64)
+        for (_, name, _), weight in zip(group, scaled):
+            yield (nationality, name, int(weight))
+
+def pipeline(global_file: str,
+             extra_file: Optional[str],
+             rng: np.random.Generator,
+             extra_nationality: str = "Indian",
+             zipf_a: float = 1.5,
+             excluded: Sequence[str] = ("English",),
+             target_ratio: int = 775) -> Iterator[Row]:
+    rows = clean(read_surnames(global_file))
+    if extra_file:
+        rows = enrich(rows, read_surnames(extra_file, nationality=extra_nationality, name_column="Name"))
+    rows = zipf_weight(rows, rng, zipf_a)
+    rows = sort_by_weight(rows)
+    rows = drop_nationalities(rows, excluded)
+    return rescale(rows, target_ratio)
+
+# The prepared pool as parallel arrays: nationality id, name and weight per surname
+def save_table(rows: Iterable[Row], filename: str):
+    nationality_ids, nationality_names, names, weights = [], {}, [], []
+    for nationality, name, weight in rows:
+        nationality_ids.append(nationality_names.setdefault(nationality, len(nationality_names)))
+        names.append(name)
+        weights.append(weight)
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    tmp = filename + ".tmp.npz"
+    np.savez(tmp,
+             nationality_names=np.array(list(nationality_names), dtype=str),
+             nationalities=np.array(nationality_ids, dtype=np.uint16),
+             names=np.array(names, dtype=str),
+             weights=np.array(weights, dtype=np.int64))
+    os.replace(tmp, filename)
+
+# Read a prepared table in the load_immigrant_surnames format: nationality -> [(name, weight), ...]
+def load_table(filename: str) -> Dict[str, List[Tuple[str, int]]]:
+    with np.load(filename) as data:
+        nationality_names = data["nationality_names"].tolist()
+        nationalities = data["nationalities"]
+        names = data["names"].tolist()
+        weights = data["weights"].tolist()
+    pool = {nationality: [] for nationality in nationality_names}
+    for nationality_id, name, weight in zip(nationalities.tolist(), names, weights):
+        pool[nationality_names[nationality_id]].append((name, weight))
+    return pool
+
+def write_csv(filename: str, table_file: str):
+    with open(filename, 'w', newline='', encoding='utf-8') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(['nationality', 'name', 'ZipfPopularity'])
+        for nationality, entries in load_table(table_file).items():
+            writer.writerows((nationality, name, weight) for name, weight in entries)
+
+# Build (or reuse) the prepared immigrant table and return its filename, for run_simulation(immigrant_file=...).
+# The Zipf weights are random, so the seed is part of the cache key; it defaults to a fixed one so that
+# unchanged inputs always find their cached table.
+def prepare(global_file: str = "auxilliary_csvs/global_surnames.csv",
+            extra_file: Optional[str] = "auxilliary_csvs/indian_surnames.csv",
+            seed: int = 0,
+            extra_nationality: str = "Indian",
+            zipf_a: float = 1.5,
+            excluded: Sequence[str] = ("English",),
+            target_ratio: int = 775,
+            cache_dir: str = "prepared/cache") -> str:
+    params = {"extra_nationality": extra_nationality, "zipf_a": zipf_a, "excluded": sorted(excluded),
+              "target_ratio": target_ratio, "seed": seed}
+    payload = {"params": params, "inputs": [file_digest(f) if f else None for f in (global_file, extra_file)]}
+    key = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    filename = os.path.join(cache_dir, key + ".npz")
+    if os.path.exists(filename):
+        return filename
+
+    rng = np.random.default_rng(seed)
+    save_table(pipeline(global_file, extra_file, rng, extra_nationality, zipf_a, excluded, target_ratio), filename)
+    return filename
+
+if __name__ == "__main__":
+    table = prepare()
+    write_csv("global_surnames_final.csv", table)
+    print(f"Prepared table {table} written to global_surnames_final.csv")
@@ -0,0 +1,315 @@
+import csv
+import json
+import numpy as np
+import os
+from typing import Iterator, List, Optional, Tuple
+from vocabulary import Vocabulary
+
+# A whole run in one place: the surname dictionary once, then (surname_id, count) pairs for every generation
+# in order. The default ".run" format is a directory of raw little-endian columns, appended to generation by
+# generation and memory-mapped on read:
+#
+#   manifest.json    surname and nationality names
+#   origins.u16      nationality id of every surname id
+#   ids.i32          surname ids of every generation, one after another
+#   counts.i64       their counts
+#   offsets.i64      where each generation ends in ids/counts; a generation exists once its offset is written
+#
+# Every generation is on disk as soon as write_generation returns, so a run killed part way keeps the ones
+# written so far, and analysis can pull single generations of very large runs without loading the rest.
+# ".arrow" (Arrow IPC, needs pyarrow) keeps one record batch per generation and is memory-mapped too, but
+# is only readable once closed.
+#
+# A writer given resume_generation carries on an existing run file from a checkpoint: it keeps the generations
+# up to and including that one and drops any written after it, so the file ends up as if the run had never
+# stopped. Given the checkpointed run's source as well, a writer for another file forks instead: it copies
+# those generations from the source, which is left as it was.
+
+MANIFEST = "manifest.json"
+# File name and on-disk type of every column of a .run directory
+COLUMNS = {"origins": ("origins.u16", "<u2"), "ids": ("ids.i32", "<i4"), "counts": ("counts.i64", "<i8"),
+           "offsets": ("offsets.i64", "<i8")}
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError as e:
+        raise ImportError("Arrow run files need pyarrow: pip install pyarrow") from e
+    return pa
+
+def _column_path(directory: str, name: str) -> str:
+    return os.path.join(directory, COLUMNS[name][0])
+
+# A column as a read-only memory map of its first `length` values (all of them by default); empty files
+# cannot be mapped
+def _map_column(directory: str, name: str, length: Optional[int] = None) -> np.ndarray:
+    dtype = np.dtype(COLUMNS[name][1])
+    path = _column_path(directory, name)
+    if length is None:
+        length = os.path.getsize(path) // dtype.itemsize
+    if length == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(length,))
+
+# Record batches of an Arrow run file, memory-mapped. A file whose writer never closed (the run was killed)
+# has no footer, but the batches written before that can still be read as a stream after the magic bytes.
+def _arrow_batches(filename: str) -> List:
+    pa = _require_pyarrow()
+    source = pa.memory_map(filename, 'r')
+    try:
+        reader = pa.ipc.open_file(source)
+        return [reader.get_batch(i) for i in range(reader.num_record_batches)]
+    except pa.ArrowInvalid:
+        source.seek(8)
+    batches = []
+    try:
+        for batch in pa.ipc.open_stream(source):
+            batches.append(batch)
+    except pa.ArrowInvalid:
+        pass  # a batch cut short when the run stopped
+    return batches
+
+class RunWriter:
+    def __init__(self,
+                 filename: str,
+                 surname_names: List[str],
+                 nationality_names: List[str],
+                 surname_origins: np.ndarray,
+                 resume_generation: Optional[int] = None,
+                 source: Optional[str] = None):
+        if not filename.endswith((".run", ".arrow")):
+            raise ValueError(f"Run files must end in .run or .arrow: {filename}")
+        fork = resume_generation is not None and source is not None and not same_path(source, filename)
+        if fork:
+            resume_generation, copied = None, resume_generation + 1
+        self.filename = filename
+        self.surname_names = surname_names
+        self.nationality_names = nationality_names
+        self.surname_origins = np.asarray(surname_origins, dtype=np.uint16)
+        self._arrow = None
+        self._columns = {}
+        if filename.endswith(".arrow"):
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+            self._open_arrow(resume_generation)
+        else:
+            self._open_columns(resume_generation)
+        if fork:
+            for counts in generation_counts(source, copied, surname_names, nationality_names, self.surname_origins):
+                self.write_generation(counts)
+
+    def _kept(self, written: int, resume_generation: int) -> int:
+        if written <= resume_generation:
+            raise ValueError(f"Cannot resume {self.filename} from generation {resume_generation}: "
+                             f"it holds {written} generations")
+        return resume_generation + 1
+
+    def _open_columns(self, resume_generation: Optional[int]):
+        if resume_generation is not None:
+            self._resume_columns(resume_generation)
+            return
+        os.makedirs(self.filename, exist_ok=True)
+        with open(os.path.join(self.filename, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump({"surname_names": self.surname_names, "nationality_names": self.nationality_names}, f)
+        self.surname_origins.astype(COLUMNS["origins"][1]).tofile(_column_path(self.filename, "origins"))
+        for name in ("ids", "counts", "offsets"):
+            self._columns[name] = open(_column_path(self.filename, name), 'wb')
+        self._end = 0
+
+    # Cut the columns back to the first resume_generation + 1 generations and append from there
+    def _resume_columns(self, resume_generation: int):
+        written = 0
+        if os.path.exists(os.path.join(self.filename, MANIFEST)):
+            written = os.path.getsize(_column_path(self.filename, "offsets")) // np.dtype(COLUMNS["offsets"][1]).itemsize
+        kept = self._kept(written, resume_generation)
+        self._end = int(_map_column(self.filename, "offsets", kept)[-1])
+        for name, length in (("offsets", kept), ("ids", self._end), ("counts", self._end)):
+            os.truncate(_column_path(self.filename, name), length * np.dtype(COLUMNS[name][1]).itemsize)
+            self._columns[name] = open(_column_path(self.filename, name), 'ab')
+
+    def _open_arrow(self, resume_generation: Optional[int]):
+        pa = _require_pyarrow()
+        self._schema = pa.schema([
+            ("surname", pa.dictionary(pa.int32(), pa.string())),
+            ("nationality", pa.dictionary(pa.uint16(), pa.string())),
+            ("count", pa.int64()),
+        ], metadata={"surname_origins": self.surname_origins.tobytes()})
+        self._surname_dictionary = pa.array(self.surname_names, type=pa.string())
+        self._nationality_dictionary = pa.array(self.nationality_names, type=pa.string())
+        if resume_generation is None:
+            self._arrow = pa.ipc.new_file(self.filename, self._schema)
+            return
+
+        # The old file is mapped and moved aside, then its kept batches are copied into a new one
+        if not os.path.exists(self.filename):
+            self._kept(0, resume_generation)
+        batches = _arrow_batches(self.filename)
+        kept = self._kept(len(batches), resume_generation)
+        previous = self.filename + ".old"
+        os.replace(self.filename, previous)
+        self._arrow = pa.ipc.new_file(self.filename, self._schema)
+        for batch in batches[:kept]:
+            self._write_batch(batch.column(0).indices.to_numpy(), batch.column(2).to_numpy())
+        os.remove(previous)
+
+    def _write_batch(self, ids: np.ndarray, values: np.ndarray):
+        pa = _require_pyarrow()
+        self._arrow.write_batch(pa.record_batch([
+            pa.DictionaryArray.from_arrays(pa.array(ids), self._surname_dictionary),
+            pa.DictionaryArray.from_arrays(pa.array(self.surname_origins[ids]), self._nationality_dictionary),
+            pa.array(values),
+        ], schema=self._schema))
+
+    # Append the next generation from its per-surname count vector; only surnames still alive are kept
+    def write_generation(self, counts: np.ndarray):
+        ids = np.flatnonzero(counts).astype(np.int32)
+        values = np.asarray(counts)[ids].astype(np.int64)
+        if self._arrow is not None:
+            self._write_batch(ids, values)
+            return
+        # The data goes out before the offset that makes the generation visible to readers
+        self._columns["ids"].write(ids.astype(COLUMNS["ids"][1]).tobytes())
+        self._columns["counts"].write(values.astype(COLUMNS["counts"][1]).tobytes())
+        self._columns["ids"].flush()
+        self._columns["counts"].flush()
+        self._end += len(ids)
+        self._columns["offsets"].write(np.array([self._end], dtype=COLUMNS["offsets"][1]).tobytes())
+        self._columns["offsets"].flush()
+
+    def close(self):
+        if self._arrow is not None:
+            self._arrow.close()
+            self._arrow = None
+        for f in self._columns.values():
+            f.close()
+        self._columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Read side of a run file (or of a directory of per-generation CSVs); generation i is the i-th one written
+class StoredRun:
+    def __init__(self, filename: str):
+        self._reader = None
+        if filename.endswith(".arrow"):
+            pa = _require_pyarrow()
+            self._reader = pa.ipc.open_file(pa.memory_map(filename, 'r'))
+            schema = self._reader.schema
+            self.surname_origins = np.frombuffer(schema.metadata[b"surname_origins"], dtype=np.uint16)
+            self.surname_names = self._dictionary(0)
+            self.nationality_names = self._dictionary(1)
+        elif os.path.exists(os.path.join(filename, MANIFEST)):
+            self._read_columns(filename)
+        elif os.path.isdir(filename):
+            self._read_csv_dir(filename)
+        elif not os.path.exists(filename):
+            raise FileNotFoundError(f"No run at {filename}")
+        else:
+            raise ValueError(f"Not a .run or .arrow run file or a directory of generation CSVs: {filename}")
+
+    # Generations whose offset has been written; anything after the last one (a write cut short) is ignored
+    def _read_columns(self, directory: str):
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.surname_names = manifest["surname_names"]
+        self.nationality_names = manifest["nationality_names"]
+        self.surname_origins = _map_column(directory, "origins")
+        ends = np.array(_map_column(directory, "offsets"))
+        self.offsets = np.concatenate(([0], ends)).astype(np.int64)
+        self.ids = _map_column(directory, "ids", int(self.offsets[-1]))
+        self.counts = _map_column(directory, "counts", int(self.offsets[-1]))
+
+    # A directory of generation_XX.csv files, as the simulations write without a run file; read up to the
+    # first missing generation
+    def _read_csv_dir(self, directory: str):
+        # Rows are (surname, nationality) lineages, as the engine counts them
+        surnames, nationalities = Vocabulary(), Vocabulary()
+        ids, counts = [], []
+        while True:
+            path = os.path.join(directory, f"generation_{len(ids):02d}.csv")
+            if not os.path.exists(path):
+                break
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            gen_ids = surnames.intern_all((row["Surname"], nationalities.intern(row["Nationality"])) for row in rows)
+            ids.append(gen_ids.astype(np.int32))
+            counts.append(np.array([int(row["Count"]) for row in rows], dtype=np.int64))
+        self.surname_names = [name for name, _ in surnames.names]
+        self.nationality_names = nationalities.names
+        self.surname_origins = np.array([nationality for _, nationality in surnames.names], dtype=np.uint16)
+        self.offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum([len(i) for i in ids], out=self.offsets[1:])
+        self.ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int32)
+        self.counts = np.concatenate(counts) if counts else np.empty(0, dtype=np.int64)
+
+    def _dictionary(self, column: int) -> List[str]:
+        if self._reader.num_record_batches == 0:
+            return []
+        return self._reader.get_batch(0).column(column).dictionary.to_pylist()
+
+    def __len__(self) -> int:
+        if self._reader is not None:
+            return self._reader.num_record_batches
+        return len(self.offsets) - 1
+
+    # (surname ids, counts) for generation i; zero-copy views of the mapped file for .run and Arrow runs
+    def generation(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self._reader is not None:
+            batch = self._reader.get_batch(i)
+            return batch.column(0).indices.to_numpy(), batch.column(2).to_numpy()
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.ids[start:end], self.counts[start:end]
+
+    # Dense per-surname count vector for generation i
+    def counts_vector(self, i: int) -> np.ndarray:
+        ids, counts = self.generation(i)
+        vector = np.zeros(len(self.surname_names), dtype=np.int64)
+        vector[ids] = counts
+        return vector
+
+def open_run(filename: str) -> StoredRun:
+    return StoredRun(filename)
+
+def same_path(a: str, b: str) -> bool:
+    return os.path.abspath(a) == os.path.abspath(b)
+
+# Dense count vectors of the first `generations` generations of a stored run, over another surname dictionary
+# (matched by surname and nationality), e.g. to copy a CSV directory's generations into a run file
+def generation_counts(filename: str,
+                      generations: int,
+                      surname_names: List[str],
+                      nationality_names: List[str],
+                      surname_origins: np.ndarray) -> Iterator[np.ndarray]:
+    run = open_run(filename)
+    if len(run) < generations:
+        raise ValueError(f"Cannot copy {generations} generations from {filename}: it holds {len(run)}")
+    ids = {(name, nationality_names[n]): i for i, (name, n) in enumerate(zip(surname_names, surname_origins))}
+    mapping = np.array([ids[(name, run.nationality_names[n])]
+                        for name, n in zip(run.surname_names, run.surname_origins)], dtype=np.int64)
+    for gen in range(generations):
+        run_ids, counts = run.generation(gen)
+        vector = np.zeros(len(surname_names), dtype=np.int64)
+        vector[mapping[run_ids]] = counts
+        yield vector
+
+# Convert a run file back into the per-generation CSVs the D3 viewer reads
+def export_csv(filename: str, output_dir: str = "surname-visualisations/generations"):
+    run = open_run(filename)
+    os.makedirs(output_dir, exist_ok=True)
+    for gen in range(len(run)):
+        ids, counts = run.generation(gen)
+        order = np.argsort(-counts, kind="stable")
+        path = os.path.join(output_dir, f"generation_{gen:02d}.csv")
+        with open(path, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Surname", "Count", "Nationality"])
+            for surname_id, count in zip(ids[order], counts[order]):
+                writer.writerow([run.surname_names[surname_id], count,
+                                 run.nationality_names[run.surname_origins[surname_id]]])
+
+if __name__ == "__main__":
+    import sys
+    export_csv(*sys.argv[1:3])
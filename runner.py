@@ -0,0 +1,150 @@
+import csv
+import numpy as np
+import os
+from contextlib import nullcontext
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+from checkpoint import capture, due, restore, save_checkpoint
+from diversity import Diversity, DiversityLog, DiversityTracker
+from engine import SurnameIndex, State, simulate, surname_table
+from extinctions import ExtinctionIndex, NEVER
+from genealogy import Genealogy
+from instrument import make_tracer
+from output import BackgroundWriter
+from run_store import RunWriter, generation_counts, same_path
+
+# The generation loop every scenario shares. Runner.run drives engine.simulate and does everything a run
+# writes per generation: the lifespan index and diversity series, the generation CSVs or run file, the
+# genealogy, checkpoints and resuming from one. The scripts only add what is particular to them (live viewer,
+# console output, plots) to the steps it yields; `python cli.py` runs the scripts.
+
+# Write CSV file for D3 bubble visualisation
+def write_surname_counts(counts: np.ndarray,
+                         generation_number: int,
+                         surname_names: List[str],
+                         nationality_names: List[str],
+                         surname_origins: np.ndarray,
+                         output_dir="surname-visualisations/generations"):
+    os.makedirs(output_dir, exist_ok=True)
+
+    filename = os.path.join(output_dir, f"generation_{generation_number:02d}.csv")
+    with open(filename, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Surname", "Count", "Nationality"])
+        ids, values = surname_table(counts)
+        writer.writerows(zip([surname_names[i] for i in ids], values.tolist(),
+                             [nationality_names[n] for n in surname_origins[ids]]))
+
+# The output options every script takes:
+# run_file (.run or .arrow) stores all generations in one columnar file instead of per-generation CSVs;
+# checkpoint_file is rewritten every checkpoint_every generations and resume_from continues from one;
+# the per-surname lifespan index is saved to extinctions_file at the end of the run;
+# diversity_file collects every generation's diversity metrics (see diversity.py);
+# trace (a filename or an instrument.Tracer) records the time and allocations of every stage;
+# genealogy_dir records every child's father there for lineage queries (see genealogy.py);
+# generations_dir takes the generation CSVs when there is no run_file.
+# Resuming into the files the checkpointed run wrote cuts them back to its generation; resuming into others
+# forks a what-if branch, copying the generations up to the checkpoint into them and leaving the originals be.
+class Outputs(NamedTuple):
+    run_file: Optional[str] = None
+    checkpoint_file: Optional[str] = None
+    checkpoint_every: int = 10
+    resume_from: Optional[str] = None
+    extinctions_file: Optional[str] = "logs/extinctions.npz"
+    diversity_file: Optional[str] = "logs/diversity.csv"
+    trace: object = None
+    genealogy_dir: Optional[str] = None
+    generations_dir: str = "surname-visualisations/generations"
+
+# One generation as simulate yields it, with its diversity measures
+class Step(NamedTuple):
+    number: int
+    population: State
+    immigrants: State
+    counts: np.ndarray
+    diversity: Diversity
+
+class Runner:
+    def __init__(self,
+                 index: SurnameIndex,
+                 seed: Optional[int] = None,
+                 outputs: Outputs = Outputs()):
+        self.index = index
+        self.outputs = outputs
+        self.rng = np.random.default_rng(seed)
+        self.tracer = make_tracer(outputs.trace)
+        self.extinctions = ExtinctionIndex(index.names, index.nationalities.names, index.origins)
+        self.diversity = DiversityTracker(index.nationalities.names, index.origins, reported=index.reported)
+        # (unique surnames, population) of every generation so far, including those before a resume
+        self.history: List[Tuple[int, int]] = []
+        self.resume: Optional[Tuple[int, State]] = None
+        # Where the checkpointed run wrote its generations and diversity rows
+        self.resume_sources: Tuple[Optional[str], Optional[str]] = (None, None)
+        if outputs.resume_from:
+            checkpoint = restore(outputs.resume_from, self.rng)
+            if len(checkpoint.extinctions.origins) != len(index):
+                raise ValueError(f"{outputs.resume_from} was taken with other surname tables "
+                                 f"({len(checkpoint.extinctions.origins)} surnames, not {len(index)})")
+            self.extinctions, self.history = checkpoint.extinctions, checkpoint.history
+            # A fork with other immigration ratios still reports the nationalities that arrived before it
+            seen = set(self.extinctions.origins[self.extinctions.first_seen != NEVER].tolist())
+            reported = [name for n, name in enumerate(index.nationalities.names) if name in index.reported or n in seen]
+            self.diversity = DiversityTracker.from_extinctions(self.extinctions, reported=reported)
+            self.resume = (checkpoint.generation, checkpoint.population)
+            self.resume_sources = (checkpoint.source, checkpoint.diversity_source)
+
+    # Where the finished run can be read back from (see run_store.open_run)
+    @property
+    def source(self) -> str:
+        return self.outputs.run_file or self.outputs.generations_dir
+
+    # Run the model (simulate's keyword arguments) and write every generation as it comes
+    def run(self, generations: int, initial_pop_size: int, **model) -> Iterator[Step]:
+        index, outputs, tracer = self.index, self.outputs, self.tracer
+        # A resumed run cuts its files back to the checkpoint's generation and carries on from there, or forks
+        resume_generation = self.resume[0] if self.resume else None
+        source, diversity_source = self.resume_sources
+        run_writer = RunWriter(outputs.run_file, index.names, index.nationalities.names, index.origins,
+                               resume_generation, source) if outputs.run_file else nullcontext()
+        if not outputs.run_file and resume_generation is not None and source and \
+                not same_path(source, outputs.generations_dir):
+            for gen, counts in enumerate(generation_counts(source, resume_generation + 1, index.names,
+                                                           index.nationalities.names, index.origins)):
+                write_surname_counts(counts, gen, index.names, index.nationalities.names, index.origins,
+                                     outputs.generations_dir)
+        genealogy = Genealogy(outputs.genealogy_dir) if outputs.genealogy_dir else None
+        diversity_log = DiversityLog(outputs.diversity_file, self.diversity.columns(), resume_generation,
+                                     diversity_source) if outputs.diversity_file else nullcontext()
+
+        with run_writer, genealogy or nullcontext(), diversity_log, BackgroundWriter() as output:
+            for gen, pop, immigrants, counts in simulate(index, self.rng, generations, initial_pop_size,
+                                                         resume_from=self.resume,
+                                                         tracer=tracer,
+                                                         genealogy=genealogy,
+                                                         **model):
+                with tracer.stage("extinctions"):
+                    self.extinctions.update(gen, counts)
+                with tracer.stage("diversity"):
+                    measures = self.diversity.update(gen, counts)
+
+                if outputs.diversity_file:
+                    output.submit(tracer.wrap("write_diversity", diversity_log.write), measures)
+                if outputs.run_file:
+                    output.submit(tracer.wrap("write_run_file", run_writer.write_generation), counts)
+                else:
+                    output.submit(tracer.wrap("write_surname_counts", write_surname_counts), counts, gen,
+                                  index.names, index.nationalities.names, index.origins, outputs.generations_dir)
+
+                self.history.append((measures.richness, len(pop)))
+                if due(gen, outputs.checkpoint_file, outputs.checkpoint_every):
+                    with tracer.stage("checkpoint"):
+                        # A checkpoint must never be ahead of the files written so far
+                        output.flush()
+                        save_checkpoint(outputs.checkpoint_file,
+                                        capture(gen, pop, self.rng, self.extinctions, self.history,
+                                                os.path.abspath(self.source),
+                                                outputs.diversity_file and os.path.abspath(outputs.diversity_file)))
+
+                yield Step(gen, pop, immigrants, counts, measures)
+
+        if outputs.extinctions_file:
+            self.extinctions.save(outputs.extinctions_file)
@@ -0,0 +1,37 @@
+import numpy as np
+from typing import Sequence
+
+# Walker/Vose alias table: O(K) to build, O(1) per draw, bulk draws in one call
+class AliasSampler:
+    def __init__(self, weights: Sequence[float]):
+        weights = np.asarray(weights, dtype=float)
+        if weights.ndim != 1 or len(weights) == 0:
+            raise ValueError("AliasSampler needs a non-empty 1-D weight vector")
+        if np.any(weights < 0) or weights.sum() <= 0:
+            raise ValueError("AliasSampler weights must be non-negative with a positive sum")
+
+        n = len(weights)
+        scaled = weights * (n / weights.sum())
+        prob = np.ones(n)
+        alias = np.arange(n)
+
+        small = list(np.flatnonzero(scaled < 1.0))
+        large = list(np.flatnonzero(scaled >= 1.0))
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+        # Whatever is left over is 1 up to rounding error
+        self.prob = prob
+        self.alias = alias
+
+    def __len__(self) -> int:
+        return len(self.prob)
+
+    # Draw k indices into the weight vector
+    def sample(self, k: int, rng: np.random.Generator) -> np.ndarray:
+        columns = rng.integers(0, len(self.prob), size=k)
+        return np.where(rng.random(k) < self.prob[columns], columns, self.alias[columns])
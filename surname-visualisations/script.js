@@ -3,7 +3,6 @@ const width = window.innerWidth;
 const height = window.innerHeight * 0.85;
 svg.attr("width", width).attr("height", height);
 
-const generations = 50;
 const interval = 1000; // ms between frames
 let generationIndex = 0;
 
@@ -26,21 +25,48 @@ function loadCSVData(gen) {
   }));
 }
 
-function updateBubbles(data, genNumber) {
-  d3.select("#generation-label").text(`Generation ${genNumber}`);
+// Positions precomputed by layout.py (centre-relative x, y and radius in pixels)
+function loadLayoutData(gen) {
+  const genStr = gen.toString().padStart(2, '0');
+  return d3.csv(`layouts/layout_${genStr}.csv`, d => ({
+    surname: d.Surname,
+    count: +d.Count,
+    nationality: d.Nationality || "Unknown",
+    x: +d.X,
+    y: +d.Y,
+    r: +d.R
+  }));
+}
 
+// Fallback for generations without a layout file: run the force simulation here
+function computeLayout(data) {
   const maxCount = d3.max(data, d => d.count);
   const radiusScale = d3.scaleSqrt().domain([1, maxCount]).range([2, 40]);
+  data.forEach(d => { d.r = radiusScale(d.count); });
 
   const simulation = d3.forceSimulation(data)
     .force("charge", d3.forceManyBody().strength(0))
-    .force("center", d3.forceCenter(width / 2, height / 2))
-    .force("collision", d3.forceCollide(d => radiusScale(d.count) + 1))
+    .force("center", d3.forceCenter(0, 0))
+    .force("collision", d3.forceCollide(d => d.r + 1))
     .stop();
 
   for (let i = 0; i < 120; ++i) simulation.tick();
+  return data;
+}
+
+function loadGeneration(gen) {
+  return loadLayoutData(gen).catch(() => loadCSVData(gen).then(computeLayout));
+}
+
+function updateBubbles(data, genNumber) {
+  d3.select("#generation-label").text(`Generation ${genNumber}`);
 
-  const bubbles = svg.selectAll("circle").data(data, d => d.surname);
+  // Shrink the layout to fit the window if needed
+  const extent = d3.max(data, d => Math.hypot(d.x, d.y) + d.r) || 1;
+  const scale = Math.min(1, Math.min(width, height) / 2 / extent);
+
+  // A surname that arrived with two nationalities is two bubbles
+  const bubbles = svg.selectAll("circle").data(data, d => `${d.surname}|${d.nationality}`);
 
   // Exit
   bubbles.exit().remove();
@@ -49,42 +75,144 @@ function updateBubbles(data, genNumber) {
   const enter = bubbles.enter()
     .append("circle")
     .attr("r", 0)
-    .attr("cx", width / 2)
-    .attr("cy", height / 2)
+    .attr("cx", d => width / 2 + d.x * scale)
+    .attr("cy", d => height / 2 + d.y * scale)
     .attr("fill", d => nationalityColors[d.nationality] || nationalityColors.Unknown);
 
   // Update + Enter
   enter.merge(bubbles)
     .transition().duration(800)
-    .attr("r", d => radiusScale(d.count))
-    .attr("cx", d => d.x)
-    .attr("cy", d => d.y)
+    .attr("r", d => d.r * scale)
+    .attr("cx", d => width / 2 + d.x * scale)
+    .attr("cy", d => height / 2 + d.y * scale)
     .attr("fill", d => nationalityColors[d.nationality] || nationalityColors.Unknown);
 }
 
-function animateGenerations() {
-  const genStr = generationIndex.toString().padStart(2, '0');
-  loadCSVData(generationIndex).then(data => {
-    updateBubbles(data, generationIndex);
+// Whole-run bundle written by bundle.py: fetched once, then each frame applies that generation's changes (ids
+// stored as gaps). A place is ring * angle_steps + angle, and rings are that frame's ring distances.
+function loadBundle() {
+  return d3.json("run_bundle.json").then(bundle => {
+    const steps = bundle.manifest.angle_steps;
+    const nationalities = bundle.manifest.nationalities;
+    let current = new Map();
+    let rings = [];
+    let next = 0;
+
+    return {
+      generations: bundle.manifest.generations,
+      colours: bundle.manifest.colours,
+      generation(gen) {
+        if (gen < next) {
+          current = new Map();
+          next = 0;
+        }
+        for (; next <= gen; ++next) {
+          const frame = bundle.frames[next];
+          rings = frame.rings;
+          let id = 0;
+          frame.ids.forEach((gap, i) => {
+            id += gap;
+            if (frame.counts[i] === 0) {
+              current.delete(id);
+            } else {
+              current.set(id, {
+                surname: bundle.surnames[id],
+                count: frame.counts[i],
+                nationality: nationalities[bundle.nationalities[id]],
+                place: frame.places[i]
+              });
+            }
+          });
+        }
+        const data = Array.from(current.values(), d => {
+          const distance = rings[Math.floor(d.place / steps)];
+          const angle = (d.place % steps) / steps * 2 * Math.PI;
+          return {...d, x: distance * Math.cos(angle), y: distance * Math.sin(angle)};
+        });
+        const maxCount = d3.max(data, d => d.count);
+        const radiusScale = d3.scaleSqrt().domain([1, maxCount]).range([2, 40]);
+        data.forEach(d => { d.r = radiusScale(d.count); });
+        return Promise.resolve(data);
+      }
+    };
+  });
+}
 
-    generationIndex = (generationIndex + 1) % generations;
+// Without a bundle, fetch generation files one at a time until one is missing
+function fileSource() {
+  return {
+    generations: Infinity,
+    colours: {},
+    generation: loadGeneration
+  };
+}
 
-    setTimeout(() => animateGenerations(), interval);
+function animateGenerations(source) {
+  source.generation(generationIndex).then(data => {
+    updateBubbles(data, generationIndex);
+    generationIndex = (generationIndex + 1) % source.generations;
+    setTimeout(() => animateGenerations(source), interval);
   }).catch(error => {
-    console.error("Error loading generation data:", error);
+    if (generationIndex > 0) {
+      generationIndex = 0;
+      animateGenerations(source);
+    } else {
+      console.error("Error loading generation data:", error);
+    }
   });
 }
 
+function drawLegend(colours) {
+  const legend = d3.select("#legend");
+  Object.entries(colours).forEach(([name, color]) => {
+    const item = legend.append("div").attr("class", "legend-item");
+    item.append("div")
+        .attr("class", "legend-swatch")
+        .style("background-color", color);
+    item.append("span").text(name);
+  });
+}
 
-animateGenerations();
+// Live mode (page opened from run_simulation(live_port=...) as /?live): draw each generation as the server
+// pushes it; the server skips generations this page is too slow for
+function watchLive() {
+  const events = new EventSource("events");
+  let manifest = null;
+
+  events.addEventListener("manifest", e => {
+    manifest = JSON.parse(e.data);
+    Object.assign(nationalityColors, manifest.colours);
+    d3.select("#legend").selectAll("*").remove();
+    drawLegend(nationalityColors);
+  });
 
-const legend = d3.select("#legend");
+  events.addEventListener("generation", e => {
+    const frame = JSON.parse(e.data);
+    const scale = manifest.position_scale;
+    const data = frame.ids.map((id, i) => ({
+      surname: manifest.surnames[id],
+      count: frame.counts[i],
+      nationality: manifest.nationalities[manifest.origins[id]],
+      x: frame.x[i] / scale,
+      y: frame.y[i] / scale
+    }));
+    const maxCount = d3.max(data, d => d.count);
+    const radiusScale = d3.scaleSqrt().domain([1, maxCount]).range([2, 40]);
+    data.forEach(d => { d.r = radiusScale(d.count); });
+    updateBubbles(data, frame.generation);
+    d3.select("#generation-label")
+      .text(`Generation ${frame.generation}: ${frame.population} people, ${frame.unique} surnames`);
+  });
 
-Object.entries(nationalityColors).forEach(([name, color]) => {
-  const item = legend.append("div").attr("class", "legend-item");
-  item.append("div")
-      .attr("class", "legend-swatch")
-      .style("background-color", color);
-  item.append("span").text(name);
-});
+  events.addEventListener("done", () => events.close());
+}
 
+if (new URLSearchParams(window.location.search).has("live")) {
+  watchLive();
+} else {
+  loadBundle().catch(() => fileSource()).then(source => {
+    Object.assign(nationalityColors, source.colours);
+    drawLegend(nationalityColors);
+    animateGenerations(source);
+  });
+}
@@ -0,0 +1,96 @@
+import csv
+import hashlib
+import itertools
+import json
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence, Tuple
+from ensemble import EnsembleSummary, run_ensemble
+from prepare_surnames import file_digest
+
+# Every combination of the values in grid, e.g. {"immigration_fraction": [0.2, 0.4]}
+def parameter_grid(grid: Dict[str, Sequence]) -> List[Dict]:
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+# Cache key for one sweep point: its parameters, seed and the contents (not names) of its input files
+def run_key(params: Dict, seed: Optional[int], input_files: Sequence[Optional[str]]) -> str:
+    payload = {
+        "params": params,
+        "seed": seed,
+        "inputs": [file_digest(f) if f else None for f in input_files],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def load_summary(filename: str) -> EnsembleSummary:
+    with np.load(filename) as data:
+        return EnsembleSummary(int(data["replicates"]), *(data[f] for f in EnsembleSummary._fields[1:]))
+
+# Write to a temporary file first so an interrupted sweep never leaves a truncated result behind
+def save_summary(summary: EnsembleSummary, params: Dict, filename: str):
+    tmp = filename + ".tmp.npz"
+    np.savez(tmp, params=json.dumps(params, sort_keys=True, default=str), **summary._asdict())
+    os.replace(tmp, filename)
+
+def _run_point(native_file: str, immigrant_file: Optional[str], params: Dict, seed: Optional[int], filename: str) -> str:
+    summary = run_ensemble(native_file, immigrant_file, seed=seed, workers=1, **params)
+    save_summary(summary, params, filename)
+    return filename
+
+# Run every grid point not already in cache_dir, spreading points across worker processes.
+# fixed holds settings shared by all points (replicates, generations, model flags, ...).
+def run_sweep(native_file: str,
+              grid: Dict[str, Sequence],
+              immigrant_file: Optional[str] = None,
+              seed: Optional[int] = None,
+              workers: Optional[int] = None,
+              cache_dir: str = "sweeps/cache",
+              **fixed) -> List[Tuple[Dict, EnsembleSummary]]:
+    os.makedirs(cache_dir, exist_ok=True)
+    points = []
+    for point in parameter_grid(grid):
+        params = {**fixed, **point}
+        filename = os.path.join(cache_dir, run_key(params, seed, [native_file, immigrant_file]) + ".npz")
+        points.append((point, params, filename))
+
+    pending = [(params, filename) for _, params, filename in points if not os.path.exists(filename)]
+    print(f"Sweep: {len(points)} points, {len(points) - len(pending)} cached, {len(pending)} to run")
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_point, native_file, immigrant_file, params, seed, filename)
+                       for params, filename in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                print(f"Finished {done}/{len(pending)}: {future.result()}")
+
+    return [(point, load_summary(filename)) for point, _, filename in points]
+
+# One row per grid point with the final-generation means
+def write_sweep_summary(results: List[Tuple[Dict, EnsembleSummary]], filename: str):
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    keys = list(results[0][0]) if results else []
+    with open(filename, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(keys + ["Final Unique Surnames Mean", "Final Population Mean"])
+        for point, summary in results:
+            writer.writerow([json.dumps(point[k]) if isinstance(point[k], dict) else point[k] for k in keys]
+                            + [summary.unique_mean[-1], summary.population_mean[-1]])
+
+if __name__ == "__main__":
+    results = run_sweep(
+        native_file="surnames_sorted.csv",
+        immigrant_file="global_surnames_final.csv",
+        grid={
+            "immigration_fraction": [0.1, 0.2, 0.3, 0.4],
+            "initial_pop_size": [10000, 100000],
+            "immigration_ratios": [
+                {"Indian": 0.4, "Russian": 0.3, "Polish": 0.2, "Arabic": 0.1},
+                {"Indian": 0.25, "Russian": 0.25, "Polish": 0.25, "Arabic": 0.25},
+            ],
+        },
+        seed=0,
+        replicates=50,
+        generations=50,
+    )
+    write_sweep_summary(results, "sweeps/summary.csv")
@@ -0,0 +1,26 @@
+import numpy as np
+import os
+import pytest
+from ensemble import CONTROL_MODEL, IMMIGRATION_MODEL, run_ensemble
+
+# aggregate=True draws per-surname counts instead of simulating every person. Over a seeded ensemble it must
+# give the same mean surname richness and population as the individual model, to within sampling noise.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NATIVE_FILE = os.path.join(HERE, "surnames_sorted.csv")
+IMMIGRANT_FILE = os.path.join(HERE, "global_surnames_final.csv")
+
+SCENARIOS = {
+    "immigration": (IMMIGRANT_FILE, dict(IMMIGRATION_MODEL, immigration_fraction=0.3,
+                                         immigration_ratios={"Indian": 0.5, "Polish": 0.5})),
+    "control": (None, dict(CONTROL_MODEL, mean_children_per_couple=2.1)),
+}
+
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_aggregate_matches_individual_means(scenario):
+    immigrant_file, model = SCENARIOS[scenario]
+    individual, aggregate = (run_ensemble(NATIVE_FILE, immigrant_file, replicates=40, generations=20, seed=1,
+                                          workers=1, initial_pop_size=5000, aggregate=mode, **model)
+                             for mode in (False, True))
+    assert np.allclose(aggregate.unique_mean, individual.unique_mean, rtol=0.05)
+    assert np.allclose(aggregate.population_mean, individual.population_mean, rtol=0.05)
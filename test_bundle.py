@@ -0,0 +1,44 @@
+import json
+import numpy as np
+import os
+from bundle import bundle_run
+from layout import BubbleLayout
+from run_store import open_run
+
+# The viewer's bundle must replay the run's counts exactly and its layout to about a pixel, and stay smaller
+# than the CSVs it replaces
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GENERATIONS = os.path.join(HERE, "surname-visualisations", "generations")
+
+def test_bundle_replays_every_generation(tmp_path):
+    bundle_run(GENERATIONS, str(tmp_path / "bundle.json"))
+    with open(tmp_path / "bundle.json", encoding='utf-8') as f:
+        bundle = json.load(f)
+    run = open_run(GENERATIONS)
+    assert bundle["manifest"]["generations"] == len(run)
+
+    steps = bundle["manifest"]["angle_steps"]
+    layout = BubbleLayout(len(run.surname_names))
+    counts, places = {}, {}
+    for gen, frame in enumerate(bundle["frames"]):
+        # Applied as script.js's loadBundle does
+        for surname_id, count, place in zip(np.cumsum(frame["ids"]).tolist(), frame["counts"], frame["places"]):
+            counts[surname_id], places[surname_id] = count, place
+        shown = {(bundle["surnames"][i], bundle["nationalities"][i]): (c, places[i]) for i, c in counts.items() if c}
+
+        ids, values = run.generation(gen)
+        assert {key: c for key, (c, _) in shown.items()} == \
+               {(run.surname_names[i], run.surname_origins[i]): int(c) for i, c in zip(ids, values)}
+
+        placed = layout.place(run.counts_vector(gen))
+        for i, x, y in zip(placed.ids, placed.x, placed.y):
+            _, place = shown[(run.surname_names[i], run.surname_origins[i])]
+            distance = frame["rings"][place // steps]
+            angle = (place % steps) / steps * 2 * np.pi
+            assert np.hypot(distance * np.cos(angle) - x, distance * np.sin(angle) - y) < 1.2
+
+def test_bundle_is_smaller_than_the_csvs(tmp_path):
+    bundle_run(GENERATIONS, str(tmp_path / "bundle.json"))
+    csvs = sum(entry.stat().st_size for entry in os.scandir(GENERATIONS))
+    assert os.path.getsize(tmp_path / "bundle.json") < csvs
@@ -0,0 +1,25 @@
+from prepare_surnames import load_table, prepare
+from sweep import run_key
+
+# Cached results are keyed on input contents, so an input edited within the same process must not hit the
+# entry cached for its old contents
+
+def write(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("nationality,nationality_index,split,name\n" + "".join(f"{n},0,train,{name}\n" for n, name in rows))
+
+def test_prepare_sees_an_edited_input(tmp_path):
+    source = tmp_path / "global.csv"
+    write(source, [("Polish", "Nowak"), ("Polish", "Kowalski")])
+    first = prepare(str(source), None, cache_dir=str(tmp_path / "cache"))
+    write(source, [("Polish", "Nowak"), ("Polish", "Wisniewski")])
+    second = prepare(str(source), None, cache_dir=str(tmp_path / "cache"))
+    assert second != first
+    assert "Wisniewski" in [name for name, _ in load_table(second)["Polish"]]
+
+def test_sweep_key_sees_an_edited_input(tmp_path):
+    source = tmp_path / "native.csv"
+    source.write_text("Surname,Count\nSmith,10\n", encoding='utf-8')
+    first = run_key({}, 0, [str(source)])
+    source.write_text("Surname,Count\nJones,10\n", encoding='utf-8')
+    assert run_key({}, 0, [str(source)]) != first
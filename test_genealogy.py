@@ -0,0 +1,71 @@
+import numpy as np
+import os
+import pytest
+from engine import MALE, simulate
+from ensemble import load_index
+from genealogy import FOUNDER, Genealogy
+
+# The pruned genealogy must answer lineage queries as the full father links would. The links the engine
+# hands over are also kept here unpruned, and the queries are checked against walks over those.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GENERATIONS = 12
+
+class Recording(Genealogy):
+    def __init__(self, directory: str, prune_every: int = 1):
+        super().__init__(directory, prune_every)
+        self.links = []
+
+    def founders(self, count: int):
+        if not self.links:
+            self.links.append([])
+        self.links[-1].append(np.full(count, FOUNDER))
+        super().founders(count)
+
+    def children(self, parents: np.ndarray):
+        self.links.append([np.array(parents)])
+        super().children(parents)
+
+@pytest.fixture(scope="module", params=[1, 3])
+def run(request, tmp_path_factory):
+    index = load_index(os.path.join(HERE, "surnames_sorted.csv"), os.path.join(HERE, "global_surnames_final.csv"),
+                       ["Indian", "Polish"])
+    directory = str(tmp_path_factory.mktemp("genealogy"))
+    rng = np.random.default_rng(3)
+    with Recording(directory, prune_every=request.param) as recording:
+        populations = [generation.population
+                       for generation in simulate(index, rng, GENERATIONS, 3000, immigration_fraction=0.2,
+                                                  immigration_ratios={"Indian": 0.5, "Polish": 0.5},
+                                                  genealogy=recording)]
+    links = [np.concatenate(parts).astype(np.int64) for parts in recording.links]
+    return Genealogy.open(directory), populations, links
+
+# Ancestor positions in `generation` of everyone in the newest one, walking the unpruned links
+def walk(links, generation):
+    rows = np.arange(len(links[-1]))
+    for g in range(len(links) - 1, generation, -1):
+        rows = np.where(rows == FOUNDER, FOUNDER, links[g][np.maximum(rows, 0)])
+    return rows
+
+@pytest.mark.parametrize("generation", [0, 3, 7, 10])
+def test_ancestors_are_men_of_the_same_surname(run, generation):
+    genealogy, populations, links = run
+    ancestors = genealogy.ancestors(generation)
+    assert np.array_equal(ancestors, walk(links, generation))
+
+    linked = ancestors != FOUNDER
+    assert linked.any()
+    ancestry = populations[generation]
+    assert np.array_equal(ancestry.surnames[ancestors[linked]], populations[-1].surnames[linked])
+    assert (ancestry.sexes[ancestors[linked]] == MALE).all()
+
+def test_founder_survival(run):
+    genealogy, populations, links = run
+    assert genealogy.generations == len(populations) == GENERATIONS
+    survival = genealogy.founder_survival()
+    for generation, parents in enumerate(links):
+        founders = np.flatnonzero(parents == FOUNDER)
+        surviving = np.intersect1d(founders, walk(links, generation))
+        assert np.array_equal(genealogy.surviving_founders(generation), surviving)
+        assert survival[generation] == pytest.approx(len(surviving) / len(founders))
+    assert np.nanmax(survival) <= 1
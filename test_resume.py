@@ -0,0 +1,120 @@
+import csv
+import numpy as np
+import os
+import pytest
+from bundle import bundle_run
+from ensemble import load_index
+from run_store import open_run
+from runner import Outputs, Runner
+
+# A run stopped part way and resumed from its last checkpoint must leave the same run file and history as one
+# that never stopped, including when generations after the checkpoint had already been written. Resuming into
+# other files forks: they get the shared prefix and the original run is left as it was.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RATIOS = {"Indian": 0.5, "Polish": 0.5}
+MODEL = dict(immigration_fraction=0.3, immigration_ratios=RATIOS)
+
+def load(nationalities):
+    return load_index(os.path.join(HERE, "surnames_sorted.csv"), os.path.join(HERE, "global_surnames_final.csv"),
+                      nationalities)
+
+@pytest.fixture(scope="module")
+def index():
+    return load(list(RATIOS))
+
+def outputs(tmp_path, run_file, **options) -> Outputs:
+    settings = dict(checkpoint_file=str(tmp_path / "checkpoint.npz"), checkpoint_every=4, extinctions_file=None,
+                    diversity_file=None)
+    return Outputs(run_file=str(tmp_path / run_file), **dict(settings, **options))
+
+def assert_same_run(a: str, b: str):
+    a, b = open_run(a), open_run(b)
+    assert len(a) == len(b)
+    for gen in range(len(a)):
+        assert np.array_equal(a.counts_vector(gen), b.counts_vector(gen))
+
+@pytest.mark.parametrize("extension", [".run", ".arrow"])
+def test_resume_matches_uninterrupted_run(tmp_path, index, extension):
+    if extension == ".arrow":
+        pytest.importorskip("pyarrow")
+    full = Runner(index, 5, outputs(tmp_path, "full" + extension, checkpoint_file=None))
+    list(full.run(10, 2000, **MODEL))
+
+    # Stopped after generation 5: generations 4 and 5 are written but the checkpoint is from generation 3
+    stopped = Runner(index, 5, outputs(tmp_path, "resumed" + extension))
+    for step in stopped.run(10, 2000, **MODEL):
+        if step.number == 5:
+            break
+    assert len(open_run(str(tmp_path / ("resumed" + extension)))) == 6
+
+    resumed = Runner(index, 99, outputs(tmp_path, "resumed" + extension,
+                                        resume_from=str(tmp_path / "checkpoint.npz")))
+    list(resumed.run(10, 2000, **MODEL))
+    assert resumed.history == full.history
+    assert_same_run(str(tmp_path / ("resumed" + extension)), str(tmp_path / ("full" + extension)))
+
+def test_surname_ids_do_not_depend_on_the_ratios(index):
+    for nationalities in (["Polish", "Indian"], ["Arabic"], None):
+        other = load(nationalities)
+        assert other.names == index.names
+        assert np.array_equal(other.origins, index.origins)
+
+def test_resume_with_other_ratios(tmp_path, index):
+    runner = Runner(index, 5, outputs(tmp_path, "run.run", diversity_file=str(tmp_path / "diversity.csv")))
+    list(runner.run(4, 2000, **MODEL))
+    before = open_run(str(tmp_path / "run.run")).counts_vector(3)
+
+    ratios = {"Polish": 0.5, "Arabic": 0.5}
+    fork = Runner(load(list(ratios)), 5, outputs(tmp_path, "run.run", diversity_file=str(tmp_path / "diversity.csv"),
+                                                 resume_from=str(tmp_path / "checkpoint.npz")))
+    steps = list(fork.run(6, 2000, immigration_fraction=0.3, immigration_ratios=ratios))
+    # The carried-over population keeps its surnames, and Indian ones are still reported after the fork
+    assert np.array_equal(open_run(str(tmp_path / "run.run")).counts_vector(3), before)
+    assert fork.diversity.nationality_names == ["English", "Arabic", "Indian", "Polish"]
+    arabic, indian = steps[-1].diversity.by_nationality[1:3]
+    assert arabic > 0 and indian > 0
+    with open(tmp_path / "diversity.csv", encoding='utf-8') as f:
+        assert len({len(line.split(",")) for line in f}) == 1
+
+# (surname, nationality, count) of every surname present in one generation, whatever the run's surname ids
+def present(run, gen):
+    ids, counts = run.generation(gen)
+    return {(run.surname_names[i], run.nationality_names[run.surname_origins[i]], c)
+            for i, c in zip(ids.tolist(), counts.tolist())}
+
+def rows(filename):
+    with open(filename, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def test_fork_into_new_files(tmp_path, index):
+    original = outputs(tmp_path, "a.run", diversity_file=str(tmp_path / "a.csv"))
+    list(Runner(index, 5, original).run(6, 2000, **MODEL))
+    before = [present(open_run(original.run_file), gen) for gen in range(6)]
+    diversity = rows(tmp_path / "a.csv")
+
+    # Changed parameters from generation 3 on, into a new run file, then into a new generation CSV directory
+    forks = [outputs(tmp_path, "b.run", diversity_file=str(tmp_path / "b.csv")),
+             outputs(tmp_path, "b.run")._replace(run_file=None, generations_dir=str(tmp_path / "b"))]
+    for fork in forks:
+        fork = fork._replace(checkpoint_file=None, resume_from=str(tmp_path / "checkpoint.npz"))
+        list(Runner(load(["Arabic"]), 7, fork).run(8, 2000, immigration_fraction=0.6,
+                                                   immigration_ratios={"Arabic": 1.0}))
+        forked = open_run(fork.run_file or fork.generations_dir)
+        assert len(forked) == 8
+        assert [present(forked, gen) for gen in range(4)] == before[:4]
+        assert present(forked, 4) != before[4]
+
+    original_run = open_run(original.run_file)
+    assert [present(original_run, gen) for gen in range(len(original_run))] == before
+    assert rows(tmp_path / "a.csv") == diversity
+    # The fork reports Arabic surnames too; its rows up to the checkpoint are the original's
+    forked_diversity = rows(tmp_path / "b.csv")
+    assert [{k: row[k] for k in diversity[0]} for row in forked_diversity[:4]] == diversity[:4]
+    assert [row["Arabic Surnames"] for row in forked_diversity[:4]] == ["0"] * 4
+
+def test_bundle_refuses_a_shorter_run(tmp_path, index):
+    runner = Runner(index, 5, outputs(tmp_path, "run.run", checkpoint_file=None))
+    list(runner.run(3, 2000, **MODEL))
+    with pytest.raises(ValueError):
+        bundle_run(runner.source, str(tmp_path / "bundle.json"), len(runner.history) + 1)
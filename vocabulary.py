@@ -0,0 +1,43 @@
+import numpy as np
+from typing import Dict, Iterable, List, Sequence
+
+# Strings (or other hashable keys, like the engine's (surname, nationality) lineages) interned to small integer
+# ids, assigned in order of first appearance. Populations, count vectors and output files carry the ids; names
+# are only looked up again when something is written for people.
+class Vocabulary:
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.intern_all(names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def __getitem__(self, i: int) -> str:
+        return self.names[i]
+
+    def intern(self, name: str) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    # Intern every name and return their ids as a compact array
+    def intern_all(self, names: Iterable[str]) -> np.ndarray:
+        ids = [self.intern(name) for name in names]
+        return np.array(ids, dtype=self.dtype)
+
+    def id(self, name: str) -> int:
+        return self.ids[name]
+
+    def decode(self, ids: Sequence[int]) -> List[str]:
+        return [self.names[i] for i in ids]
+
+    # Smallest unsigned type that holds every id; ~22k surnames fit in uint16
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(np.uint16 if len(self.names) <= np.iinfo(np.uint16).max + 1 else np.uint32)